@@ -0,0 +1,60 @@
+"""Guessing an item's category from its name.
+
+Kept out of grocery_streamlit3.py because Streamlit re-executes the app
+script on every rerun, which would rebuild the compiled keyword regex and
+throw away classify_item_name's memo each run; defined here, both live
+for the whole server process.
+"""
+import re
+from functools import lru_cache
+
+# Keyword table used to guess an item's category (earlier categories win)
+CATEGORY_KEYWORDS = {
+    'Rice & Grains': ['rice', 'bread', 'oats', 'flour'],
+    'Proteins': ['chicken', 'beef', 'fish', 'eggs', 'tofu'],
+    'Dairy': ['milk', 'yogurt', 'cheese', 'butter'],
+    'Vegetables': ['potatoes', 'onions', 'carrots', 'cabbage', 'tomatoes', 'cucumber', 'spinach', 'broccoli'],
+    'Fruits': ['banana', 'apple', 'orange', 'watermelon', 'papaya', 'mango'],
+    'Pantry': ['oil', 'sauce', 'salt', 'sugar', 'garlic', 'ginger'],
+    'Beverages': ['coffee', 'tea', 'juice', 'water'],
+    'Household': ['dish', 'detergent', 'toilet', 'shampoo'],
+}
+
+def build_category_classifier(keyword_table):
+    """Compile the keyword table into one regex that finds every keyword in a single pass"""
+    keyword_rank = {}
+    for rank, keywords in enumerate(keyword_table.values()):
+        for keyword in keywords:
+            keyword_rank.setdefault(keyword, rank)
+    
+    # Group keywords by first letter so each position only tries a few branches.
+    # Within a group keywords stay in category order, so when two keywords start
+    # at the same position (e.g. 'watermelon' and 'water') the earlier category wins.
+    branches = {}
+    for keyword in sorted(keyword_rank, key=keyword_rank.get):
+        branches.setdefault(keyword[0], []).append(re.escape(keyword[1:]))
+    alternatives = [
+        re.escape(first) + (rests[0] if len(rests) == 1 else '(?:' + '|'.join(rests) + ')')
+        for first, rests in branches.items()
+    ]
+    
+    # The lookahead lets overlapping keywords match too ('toilet' also contains 'oil')
+    pattern = re.compile('(?=(' + '|'.join(alternatives) + '))')
+    return pattern, keyword_rank, list(keyword_table.keys())
+
+CATEGORY_PATTERN, KEYWORD_RANK, CATEGORY_ORDER = build_category_classifier(CATEGORY_KEYWORDS)
+
+@lru_cache(maxsize=65536)
+def classify_item_name(item_name):
+    """Pick a category from the item name using the compiled keyword classifier"""
+    best_rank = len(CATEGORY_ORDER)
+    for match in CATEGORY_PATTERN.finditer(item_name.lower()):
+        rank = KEYWORD_RANK[match.group(1)]
+        if rank < best_rank:
+            best_rank = rank
+            if rank == 0:
+                break
+    
+    if best_rank < len(CATEGORY_ORDER):
+        return CATEGORY_ORDER[best_rank]
+    return 'Other'
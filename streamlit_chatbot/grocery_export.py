@@ -0,0 +1,228 @@
+"""Streaming CSV / JSON Lines / Parquet export of the cart, the catalog and
+the purchase history.
+
+Rows are read in fixed-size batches and every writer yields encoded byte
+chunks as it goes, so write_export() (the CLI) never holds more than one
+batch (or one Parquet row group) in memory. The app's download buttons
+collect the chunks into one file, because Streamlit serves downloads from
+memory.
+
+Kept out of grocery_streamlit3.py so scheduled jobs can export the catalog
+without starting the Streamlit app:
+
+    python grocery_export.py catalog --format parquet --output catalog.parquet
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+# Rows fetched per batch, and rows per Parquet row group
+EXPORT_BATCH_ROWS = 10000
+PARQUET_ROW_GROUP_ROWS = 100000
+
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv'),
+    'jsonl': ('jsonl', 'application/x-ndjson'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+# Column names and kinds ('str', 'float', 'int' or 'timestamp' = epoch seconds)
+CART_COLUMNS = [('item', 'str'), ('price', 'float'), ('quantity', 'int'), ('subtotal', 'float')]
+CATALOG_COLUMNS = [('item', 'str'), ('price', 'float'), ('category', 'str')]
+PURCHASE_LINE_COLUMNS = [
+    ('purchase_id', 'int'),
+    ('purchased_at', 'timestamp'),
+    ('item', 'str'),
+    ('price', 'float'),
+    ('quantity', 'int'),
+    ('subtotal', 'float'),
+]
+
+def cart_batches(lines, batch_rows=EXPORT_BATCH_ROWS):
+    """Column batches for cart lines given as (item, unit price in sen, quantity)"""
+    lines = list(lines)
+    for start in range(0, len(lines), batch_rows):
+        batch = lines[start:start + batch_rows]
+        yield {
+            'item': [item for item, price_sen, qty in batch],
+            'price': [price_sen / 100 for item, price_sen, qty in batch],
+            'quantity': [qty for item, price_sen, qty in batch],
+            'subtotal': [price_sen * qty / 100 for item, price_sen, qty in batch],
+        }
+
+def catalog_batches(conn, batch_rows=EXPORT_BATCH_ROWS):
+    """Column batches for every catalog item, read from the store with one cursor"""
+    cursor = conn.execute('SELECT name, price, category FROM items ORDER BY name')
+    while True:
+        rows = cursor.fetchmany(batch_rows)
+        if not rows:
+            return
+        names, prices, categories = zip(*rows)
+        yield {'item': list(names), 'price': list(prices), 'category': list(categories)}
+
+def purchase_line_batches(history, batch_rows=EXPORT_BATCH_ROWS):
+    """Column batches for every line in a PurchaseLog, oldest first.
+    
+    Only lines present when the export starts are written, so purchases
+    saved while a download is running do not tear the file.
+    """
+    line_count = history.line_count
+    columns = history.line_columns
+    item_names = history.item_names
+    for start in range(0, line_count, batch_rows):
+        rows = slice(start, min(start + batch_rows, line_count))
+        prices_sen = columns['price_sen'][rows]
+        quantities = columns['quantity'][rows]
+        yield {
+            'purchase_id': columns['purchase_id'][rows].tolist(),
+            'purchased_at': columns['timestamp'][rows].tolist(),
+            'item': [item_names[item_id] for item_id in columns['item_id'][rows].tolist()],
+            'price': (prices_sen / 100).tolist(),
+            'quantity': quantities.tolist(),
+            'subtotal': (prices_sen * quantities / 100).tolist(),
+        }
+
+def format_timestamp(timestamp):
+    """Epoch seconds as a local 'YYYY-MM-DD HH:MM:SS' string, like the History tab"""
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+def text_columns(columns, batch):
+    """A batch's columns with timestamps turned into display strings"""
+    return [
+        [format_timestamp(value) for value in batch[name]] if kind == 'timestamp' else batch[name]
+        for name, kind in columns
+    ]
+
+def iter_csv(columns, batches):
+    """Yield a CSV file (UTF-8, header row first) one batch at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, kind in columns])
+    for batch in batches:
+        writer.writerows(zip(*text_columns(columns, batch)))
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def iter_jsonl(columns, batches):
+    """Yield one JSON object per row, one batch at a time"""
+    names = [name for name, kind in columns]
+    dumps = json.dumps
+    for batch in batches:
+        yield ''.join([
+            dumps(dict(zip(names, row)), ensure_ascii=False) + '\n'
+            for row in zip(*text_columns(columns, batch))
+        ]).encode('utf-8')
+
+class ChunkSink:
+    """Write-only file object that hands written bytes back in chunks"""
+    
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self.position
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self):
+        """Bytes written since the last drain"""
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def parquet_schema(columns):
+    import pyarrow as pa
+    types = {
+        'str': pa.string(),
+        'float': pa.float64(),
+        'int': pa.int64(),
+        'timestamp': pa.timestamp('s', tz='UTC'),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+def iter_parquet(columns, batches, row_group_rows=PARQUET_ROW_GROUP_ROWS):
+    """Yield a Parquet file, flushing one row group at a time (needs pyarrow)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = parquet_schema(columns)
+    sink = ChunkSink()
+    pending = []
+    pending_rows = 0
+    with pq.ParquetWriter(sink, schema, compression='snappy') as writer:
+        for batch in batches:
+            pending.append(pa.record_batch([batch[name] for name, kind in columns], schema=schema))
+            pending_rows += pending[-1].num_rows
+            if pending_rows >= row_group_rows:
+                writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=row_group_rows)
+                pending = []
+                pending_rows = 0
+                yield sink.drain()
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=row_group_rows)
+    yield sink.drain()
+
+def iter_export(export_format, columns, batches):
+    """Yield an export in 'csv', 'jsonl' or 'parquet' format as byte chunks"""
+    if export_format == 'csv':
+        return iter_csv(columns, batches)
+    if export_format == 'jsonl':
+        return iter_jsonl(columns, batches)
+    if export_format == 'parquet':
+        return iter_parquet(columns, batches)
+    raise ValueError(f"Unknown export format: {export_format}")
+
+def write_export(path, export_format, columns, batches):
+    """Stream an export to a file (or stdout for '-'), returning the bytes written"""
+    written = 0
+    out = sys.stdout.buffer if path == '-' else open(path, 'wb')
+    try:
+        for chunk in iter_export(export_format, columns, batches):
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    return written
+
+def default_catalog_db_path():
+    """Same catalog database the app uses (GROCERY_CATALOG_DB or next to this file)"""
+    return os.environ.get(
+        'GROCERY_CATALOG_DB',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'grocery_catalog.db')
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the grocery catalog without starting the app")
+    parser.add_argument('dataset', choices=['catalog'])
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--output', default='-', help="file to write ('-' for stdout)")
+    parser.add_argument('--db', default=default_catalog_db_path())
+    args = parser.parse_args()
+    
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    try:
+        written = write_export(args.output, args.format, CATALOG_COLUMNS, catalog_batches(conn))
+    finally:
+        conn.close()
+    if args.output != '-':
+        print(f"Wrote {written} bytes to {args.output}", file=sys.stderr)
@@ -0,0 +1,229 @@
+"""Household carts: one cart shared by several sessions, with optimistic
+versions and a feed of recent changes.
+
+Kept out of grocery_streamlit3.py because Streamlit re-executes the app
+script on every rerun, which would give each run its own CartConflict and
+HouseholdCartView classes; sessions hold views created on earlier runs, so
+isinstance() checks and except clauses need classes defined only once.
+"""
+import threading
+import time
+from collections import deque
+
+# Changes each household cart remembers for members catching up
+HOUSEHOLD_FEED_LENGTH = 256
+
+# A household cart nobody has changed or polled for this long is dropped
+HOUSEHOLD_IDLE_SECONDS = 6 * 60 * 60
+
+class CartConflict(Exception):
+    """Another household member changed the cart since this session last looked"""
+
+class HouseholdCart:
+    """A Cart shared by every session of one household, with a change feed.
+
+    Every change bumps the cart version and is appended to the feed as
+    (version, author, action, item, quantity). Adds are applied as deltas
+    under the lock, so two members adding the same item at once both
+    count. Removing a line, clearing or checking out is optimistic: it
+    fails with CartConflict if the line (or, for clear/checkout, the cart)
+    changed after the version the member last saw.
+    """
+    
+    def __init__(self, cart):
+        self.cart = cart
+        self.version = 0
+        self.line_versions = {}
+        self.changes = deque(maxlen=HOUSEHOLD_FEED_LENGTH)
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.expired = False
+    
+    def record(self, author, action, item=None, quantity=0):
+        """Log a change (the caller holds the lock)"""
+        self.version += 1
+        self.changes.append((self.version, author, action, item, quantity))
+        if item is not None:
+            self.line_versions[item] = self.version
+        self.last_used = time.monotonic()
+        return self.version
+    
+    def check_unchanged(self, seen_version, item=None):
+        if item is None:
+            changed = self.version > seen_version
+        else:
+            changed = self.line_versions.get(item, 0) > seen_version
+        if changed:
+            raise CartConflict(item)
+    
+    def add(self, author, item, price, quantity):
+        with self.lock:
+            self.cart.add(item, price, quantity)
+            return self.record(author, 'add', item, quantity)
+    
+    def remove(self, author, item, seen_version=None):
+        with self.lock:
+            if item not in self.cart:
+                return self.version
+            if seen_version is not None:
+                self.check_unchanged(seen_version, item)
+            quantity = self.cart[item].quantity
+            self.cart.remove(item)
+            return self.record(author, 'remove', item, quantity)
+    
+    def set_price(self, author, item, price):
+        with self.lock:
+            if item not in self.cart:
+                return self.version
+            self.cart.set_price(item, price)
+            return self.record(author, 'price', item)
+    
+    def rename(self, author, old_item, new_item, price):
+        with self.lock:
+            if old_item not in self.cart:
+                return self.version
+            self.cart.rename(old_item, new_item, price)
+            self.record(author, 'remove', old_item)
+            return self.record(author, 'add', new_item, self.cart[new_item].quantity)
+    
+    def take(self, author, seen_version=None):
+        """Empty the cart in one step, returning its lines (checkout or clear)"""
+        with self.lock:
+            if seen_version is not None:
+                self.check_unchanged(seen_version)
+            taken = self.cart.take()
+            self.record(author, 'clear')
+            return taken
+    
+    def snapshot(self, read):
+        """Run read(cart) under the lock (for reads that walk the lines)"""
+        with self.lock:
+            return read(self.cart)
+    
+    def changes_since(self, version):
+        """Changes after `version`, oldest first, or None if the feed no longer reaches back that far"""
+        with self.lock:
+            self.last_used = time.monotonic()
+            if version >= self.version:
+                return []
+            if not self.changes or self.changes[0][0] > version + 1:
+                return None
+            return [change for change in self.changes if change[0] > version]
+
+class HouseholdCartView:
+    """One session's handle on a HouseholdCart, usable wherever a Cart is.
+
+    seen_version is the cart version the session last polled (and drew);
+    shown_version is the one drawn on the run before, i.e. what was on
+    screen when a button was clicked. The *_if_unchanged methods are the
+    optimistic ones, checked against shown_version.
+    """
+    
+    def __init__(self, household, code, author):
+        self.household = household
+        self.code = code
+        self.author = author
+        self.seen_version = self.shown_version = household.version
+    
+    def __len__(self):
+        return len(self.household.cart)
+    
+    def __contains__(self, item):
+        return item in self.household.cart
+    
+    def __getitem__(self, item):
+        return self.household.cart[item]
+    
+    def __iter__(self):
+        return iter(self.household.snapshot(list))
+    
+    def items(self):
+        return self.household.snapshot(lambda cart: list(cart.items()))
+    
+    @property
+    def total_quantity(self):
+        return self.household.cart.total_quantity
+    
+    @property
+    def total_sen(self):
+        return self.household.cart.total_sen
+    
+    def content_hash(self):
+        return self.household.snapshot(lambda cart: cart.content_hash())
+    
+    def export_lines(self):
+        return self.household.snapshot(lambda cart: cart.export_lines())
+    
+    def saw(self, version):
+        """Move seen_version past our own change if nothing else happened in between"""
+        if self.seen_version == version - 1:
+            self.seen_version = version
+    
+    def add(self, item, price, quantity):
+        self.saw(self.household.add(self.author, item, price, quantity))
+    
+    def remove(self, item):
+        self.saw(self.household.remove(self.author, item))
+    
+    def remove_if_unchanged(self, item):
+        self.saw(self.household.remove(self.author, item, self.shown_version))
+    
+    def set_price(self, item, price):
+        self.saw(self.household.set_price(self.author, item, price))
+    
+    def rename(self, old_item, new_item, price):
+        self.household.rename(self.author, old_item, new_item, price)
+    
+    def take(self, seen_version=None):
+        taken = self.household.take(self.author, seen_version)
+        self.saw(self.household.version)
+        return taken
+    
+    def take_if_unchanged(self):
+        return self.take(self.shown_version)
+    
+    def clear(self):
+        self.take()
+    
+    def clear_if_unchanged(self):
+        self.take_if_unchanged()
+    
+    def poll(self):
+        """Changes other members made since the last poll (None if too many to list)"""
+        self.shown_version = self.seen_version
+        self.household.last_used = time.monotonic()
+        if self.household.version == self.seen_version:
+            return []
+        changes = self.household.changes_since(self.seen_version)
+        self.seen_version = self.household.version
+        if changes is None:
+            return None
+        return [change for change in changes if change[1] != self.author]
+
+class HouseholdCarts:
+    """Household carts by household code, created on first use.
+
+    Carts idle for HOUSEHOLD_IDLE_SECONDS are dropped the next time anyone
+    joins a household; a session still holding one sees `expired` set and
+    joins again.
+    """
+    
+    def __init__(self, new_cart, idle_seconds=HOUSEHOLD_IDLE_SECONDS):
+        self.new_cart = new_cart
+        self.idle_seconds = idle_seconds
+        self.lock = threading.Lock()
+        self.carts = {}
+    
+    def expire_idle(self):
+        """Drop idle carts (the caller holds the lock)"""
+        cutoff = time.monotonic() - self.idle_seconds
+        for code in [code for code, household in self.carts.items() if household.last_used < cutoff]:
+            self.carts.pop(code).expired = True
+    
+    def join(self, code):
+        with self.lock:
+            self.expire_idle()
+            household = self.carts.get(code)
+            if household is None:
+                household = self.carts[code] = HouseholdCart(self.new_cart())
+            return household
@@ -0,0 +1,205 @@
+"""Streaming CSV / JSON Lines price-list import for the catalog.
+
+Rows are parsed and validated in fixed-size batches, so a 100k-line
+supermarket price file never sits in memory as parsed rows: only the
+current batch and the first few rejected rows are kept. The accepted
+batches are meant to be written in one transaction by
+CatalogStore.upsert_batches.
+
+Files use the catalog export's columns (item, price, category), so an
+exported catalog can be edited and imported back. The category column is
+optional; an empty category means "work it out from the name".
+
+    python grocery_import.py --bench 100000
+"""
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import tempfile
+import time
+import tracemalloc
+
+# Rows validated and written per batch
+IMPORT_BATCH_ROWS = 5000
+
+# Rejected rows kept for the report (the rest are only counted)
+IMPORT_REJECTS_KEPT = 100
+
+# Longest item name accepted
+MAX_ITEM_NAME_LENGTH = 120
+
+IMPORT_FORMATS = {
+    'csv': ('.csv',),
+    'jsonl': ('.jsonl', '.ndjson'),
+}
+
+# Accepted spellings of each column
+NAME_COLUMNS = ('item', 'name')
+PRICE_COLUMNS = ('price',)
+CATEGORY_COLUMNS = ('category',)
+
+class ImportReport:
+    """Counts of accepted and rejected rows, plus the first few rejections"""
+    
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.rejected_rows = []
+    
+    def reject(self, line_number, reason, row):
+        self.rejected += 1
+        if len(self.rejected_rows) < IMPORT_REJECTS_KEPT:
+            self.rejected_rows.append((line_number, reason, row))
+
+def import_format_for(filename):
+    """'csv' or 'jsonl' from a file name's extension"""
+    extension = os.path.splitext(filename)[1].lower()
+    for import_format, extensions in IMPORT_FORMATS.items():
+        if extension in extensions:
+            return import_format
+    raise ValueError(f"Unsupported price list type: {extension or filename}")
+
+def first_field(record, names):
+    for name in names:
+        if name in record:
+            return record[name]
+    return None
+
+def iter_csv_records(text):
+    """(line number, {column: value}) for each CSV data row, read lazily"""
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [column.strip().lower() for column in header]
+    try:
+        for row in reader:
+            if not row or not any(row):
+                continue
+            yield reader.line_num, dict(zip(columns, row))
+    except csv.Error as error:
+        raise ValueError(f"line {reader.line_num}: {error}") from None
+
+def iter_jsonl_records(text):
+    """(line number, object) for each JSON Lines row; bad JSON comes back as a string"""
+    for line_number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = line
+        if isinstance(record, dict):
+            record = {str(key).lower(): value for key, value in record.items()}
+        yield line_number, record
+
+def validate_record(record, categories):
+    """(name, price, category) for a valid record, or raise ValueError with the reason"""
+    if not isinstance(record, dict):
+        raise ValueError("not a JSON object")
+    
+    name = first_field(record, NAME_COLUMNS)
+    name = ' '.join(str(name).split()) if name is not None else ''
+    if not name:
+        raise ValueError("missing item name")
+    if len(name) > MAX_ITEM_NAME_LENGTH:
+        raise ValueError(f"item name longer than {MAX_ITEM_NAME_LENGTH} characters")
+    
+    price = first_field(record, PRICE_COLUMNS)
+    if isinstance(price, str):
+        price = price.strip().removeprefix('RM').strip()
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        raise ValueError("price is not a number") from None
+    if not math.isfinite(price) or price <= 0:
+        raise ValueError("price must be positive")
+    
+    category = first_field(record, CATEGORY_COLUMNS)
+    category = str(category).strip() if category is not None else ''
+    if category:
+        category = categories.get(category.lower())
+        if category is None:
+            raise ValueError("unknown category")
+    return name, round(price, 2), category or None
+
+def iter_price_batches(binary_file, import_format, categories, report, batch_rows=IMPORT_BATCH_ROWS):
+    """Yield lists of valid (name, price, category) rows from a price list.
+    
+    categories is the list of known category names (matched without regard
+    to case); rejected rows are counted in `report` as they are met.
+    """
+    if import_format == 'csv':
+        read_records = iter_csv_records
+    elif import_format == 'jsonl':
+        read_records = iter_jsonl_records
+    else:
+        raise ValueError(f"Unknown import format: {import_format}")
+    
+    known = {category.lower(): category for category in categories}
+    text = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    try:
+        batch = []
+        for line_number, record in read_records(text):
+            try:
+                batch.append(validate_record(record, known))
+            except ValueError as error:
+                report.reject(line_number, str(error), record)
+                continue
+            if len(batch) >= batch_rows:
+                report.accepted += len(batch)
+                yield batch
+                batch = []
+        if batch:
+            report.accepted += len(batch)
+            yield batch
+    finally:
+        # Leave the caller's file open (the wrapper would close it when collected)
+        text.detach()
+
+def write_sample_price_list(path, rows, reject_every=50):
+    """A synthetic CSV price list with one bad row every `reject_every` rows"""
+    categories = ['Fruits', 'Dairy', 'Pantry', '']
+    with open(path, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.writer(out)
+        writer.writerow(['item', 'price', 'category'])
+        for i in range(rows):
+            if reject_every and i % reject_every == reject_every - 1:
+                writer.writerow([f"Imported item {i}", '-1', ''])
+            else:
+                writer.writerow([f"Imported item {i} ({1 + i % 5}kg)", f"{1 + i % 97 * 0.35:.2f}", categories[i % 4]])
+
+def benchmark(rows=100000):
+    from grocery_streamlit3 import CATEGORIES, CatalogStore
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'prices.csv')
+        write_sample_price_list(path, rows)
+        catalog = CatalogStore(os.path.join(directory, 'catalog.db'))
+        
+        report = ImportReport()
+        started = time.perf_counter()
+        with open(path, 'rb') as price_list:
+            catalog.upsert_batches(iter_price_batches(price_list, 'csv', CATEGORIES + ['Other'], report))
+        seconds = time.perf_counter() - started
+        print(f"Imported {report.accepted} rows, rejected {report.rejected} in {seconds:.2f}s "
+              f"({report.accepted / seconds:,.0f} rows/s); catalog now has {len(catalog)} items")
+        
+        # Importing the same file again updates every row; trace its peak memory
+        tracemalloc.start()
+        with open(path, 'rb') as price_list:
+            catalog.upsert_batches(iter_price_batches(price_list, 'csv', CATEGORIES + ['Other'], ImportReport()))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"Peak Python memory while re-importing: {peak / 1024 / 1024:.1f} MB "
+              f"(file {os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time a bulk price-list import into a scratch catalog")
+    parser.add_argument('--bench', type=int, default=100000, metavar='ROWS')
+    args = parser.parse_args()
+    benchmark(args.bench)
@@ -0,0 +1,91 @@
+"""Memory benchmark: per-session state with many concurrent sessions over
+one shared catalog.
+
+Every session reads the catalog through the one CatalogStore (SQLite plus
+per-version listing caches) kept by st.cache_resource, so what a session
+owns is only its cart, purchase log and category tallies. This measures
+that per-session footprint and compares it with the old layout, where
+every session held a private {name: price} dict and {name: category} dict
+of the whole catalog.
+
+    python grocery_memory_bench.py --sessions 1000 --items 50000
+"""
+import argparse
+import os
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+from grocery_streamlit3 import Cart, CatalogStore, PurchaseLog, add_to_category_tally, new_category_tally
+
+def make_session(rows, categories, cart_lines, purchases, session_number):
+    """Session state of a typical shopper: a cart, a purchase log and category tallies"""
+    offset = session_number * cart_lines % len(rows)
+    picked = [rows[(offset + line) % len(rows)] for line in range(cart_lines)]
+    
+    cart = Cart()
+    for name, price in picked:
+        cart.add(name, price, 1 + session_number % 3)
+    
+    # Each purchase is logged and counted in the category tallies, as the app does
+    history = PurchaseLog()
+    tally = new_category_tally()
+    stats = {}
+    start = datetime(2026, 1, 1)
+    for purchase in range(purchases):
+        history.append(start + timedelta(days=purchase), cart.export_lines())
+        for name, line in cart.items():
+            add_to_category_tally(tally, stats, categories[name], name, line.subtotal_sen)
+    
+    return {
+        'shopping_cart': cart,
+        'purchase_history': history,
+        'category_stats': stats,
+        'category_tally': tally,
+        'history_version': purchases,
+        'view_cache': {},
+    }
+
+def traced_size(build):
+    """Bytes still allocated by build() once it returns, and its result"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+def benchmark(sessions=1000, items=50000, cart_lines=30, purchases=20, legacy_sample=10):
+    with tempfile.TemporaryDirectory() as directory:
+        catalog = CatalogStore(os.path.join(directory, 'catalog.db'))
+        catalog.upsert_items((f"Grocery item {i} ({1 + i % 5}kg)", 1.0 + i % 50, None) for i in range(items))
+        
+        # The shared part: one listing for every session
+        shared_bytes, rows = traced_size(catalog.listing)
+        categories = catalog.categories_of(name for name, price in rows)
+        
+        session_bytes, states = traced_size(lambda: [
+            make_session(rows, categories, cart_lines, purchases, number) for number in range(sessions)
+        ])
+        
+        # Old layout: a private copy of the catalog and its categories per session
+        legacy_bytes, copies = traced_size(lambda: [
+            (dict(rows), dict(categories)) for number in range(legacy_sample)
+        ])
+        legacy_per_session = legacy_bytes / legacy_sample
+    
+    mb = 1024 * 1024
+    print(f"Catalog: {len(rows)} items, shared listing {shared_bytes / mb:.1f} MB (once per process)")
+    print(f"{len(states)} sessions ({cart_lines}-line cart, {purchases} purchases each): "
+          f"{session_bytes / mb:.1f} MB total, {session_bytes / len(states) / 1024:.1f} KB per session")
+    print(f"Private catalog copy per session (old layout, measured over {len(copies)}): "
+          f"{legacy_per_session / 1024:.1f} KB, {legacy_per_session * sessions / mb:.1f} MB at {sessions} sessions")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure per-session memory over the shared catalog")
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--items', type=int, default=50000)
+    parser.add_argument('--cart-lines', type=int, default=30)
+    parser.add_argument('--purchases', type=int, default=20)
+    args = parser.parse_args()
+    benchmark(args.sessions, args.items, args.cart_lines, args.purchases)
@@ -0,0 +1,269 @@
+"""PDF shopping lists and receipts, drawn directly with the PDF text/path
+operators (no browser, no third-party PDF library).
+
+Kept out of grocery_streamlit3.py so process-pool workers can import it
+without starting the Streamlit app.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# A4 page and margins, in points
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN_LEFT = 56
+MARGIN_RIGHT = PAGE_WIDTH - 56
+MARGIN_TOP = PAGE_HEIGHT - 52
+MARGIN_BOTTOM = 60
+
+# Vertical space used by each part of the layout
+ITEM_ROW_HEIGHT = 40
+HEADER_HEIGHT = 78
+TOTAL_SECTION_HEIGHT = 60
+
+# Built-in PDF fonts (no embedding needed) and their resource names
+FONTS = {
+    'F1': 'Helvetica',
+    'F2': 'Helvetica-Bold',
+    'F3': 'Helvetica-Oblique',
+}
+
+# Glyph widths (1/1000 em) for printable ASCII, from the standard Helvetica
+# metrics. Used to right-align amounts and centre headings.
+HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+]
+FONT_WIDTHS = {'F1': HELVETICA_WIDTHS, 'F2': HELVETICA_BOLD_WIDTHS, 'F3': HELVETICA_WIDTHS}
+
+# Colours as PDF gray levels (matching #333, #666 and #eee in the HTML export)
+DARK = 0.2
+MUTED = 0.4
+RULE = 0.93
+
+def text_width(text, font, size):
+    """Width of a string in points (non-ASCII glyphs counted as average width)"""
+    widths = FONT_WIDTHS[font]
+    units = 0
+    for char in text:
+        code = ord(char) - 32
+        units += widths[code] if 0 <= code < len(widths) else 556
+    return units * size / 1000
+
+def fit_text(text, font, size, max_width):
+    """Shorten text with '...' until it fits in max_width points"""
+    if text_width(text, font, size) <= max_width:
+        return text
+    while text and text_width(text + '...', font, size) > max_width:
+        text = text[:-1]
+    return text + '...'
+
+def format_sen(sen):
+    """'RM12.34' for an amount in sen (exact, no float rounding)"""
+    ringgit, cents = divmod(sen, 100)
+    return f"RM{ringgit}.{cents:02d}"
+
+def pdf_string(text):
+    """Encode text as a PDF literal string in the fonts' WinAnsi encoding
+    (characters outside it print as '?'; see unencodable_names)"""
+    data = text.encode('cp1252', errors='replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+def unencodable_names(lines):
+    """Item names in (item, price in sen, quantity) lines that the built-in
+    fonts cannot draw in full, e.g. Chinese or Tamil names"""
+    names = []
+    for item, price_sen, qty in lines:
+        try:
+            item.encode('cp1252')
+        except UnicodeEncodeError:
+            names.append(item)
+    return names
+
+class PageCanvas:
+    """Collects the drawing operators for one page"""
+    
+    def __init__(self):
+        self.ops = []
+    
+    def text(self, x, y, text, font='F1', size=12, gray=0.0):
+        self.ops.append(b'BT /%s %d Tf %.2f g %.2f %.2f Td %s Tj ET' % (font.encode(), size, gray, x, y, pdf_string(text)))
+    
+    def text_right(self, x, y, text, font='F1', size=12, gray=0.0):
+        self.text(x - text_width(text, font, size), y, text, font, size, gray)
+    
+    def text_centre(self, y, text, font='F1', size=12, gray=0.0):
+        self.text((PAGE_WIDTH - text_width(text, font, size)) / 2, y, text, font, size, gray)
+    
+    def rule(self, y, width=1.0, gray=DARK):
+        self.ops.append(b'%.2f G %.2f w %d %.2f m %d %.2f l S' % (gray, width, MARGIN_LEFT, y, MARGIN_RIGHT, y))
+    
+    def checkbox(self, x, y, size=11):
+        self.ops.append(b'%.2f G 1 w %.2f %.2f %d %d re S' % (DARK, x, y, size, size))
+    
+    def content(self):
+        return b'\n'.join(self.ops)
+
+def layout_document(lines, total_sen, generated, title, date_label, checkboxes):
+    """Lay a list of (item, unit price in sen, quantity) lines and a total in sen
+    out over as many pages as needed"""
+    pages = []
+    canvas = None
+    y = 0
+    
+    def new_page():
+        nonlocal canvas, y
+        canvas = PageCanvas()
+        pages.append(canvas)
+        y = MARGIN_TOP
+    
+    # Header: title, date and a heavy rule
+    new_page()
+    canvas.text_centre(y - 22, title, 'F2', 22, DARK)
+    canvas.text_centre(y - 42, f"{date_label}: {generated}", 'F1', 10, MUTED)
+    canvas.rule(y - 58, 2)
+    y -= HEADER_HEIGHT
+    
+    # One row per item: checkbox, name, quantity x price, subtotal
+    name_x = MARGIN_LEFT + (24 if checkboxes else 0)
+    name_width = MARGIN_RIGHT - 110 - name_x
+    for item, price_sen, qty in lines:
+        if y - ITEM_ROW_HEIGHT < MARGIN_BOTTOM:
+            new_page()
+        if checkboxes:
+            canvas.checkbox(MARGIN_LEFT, y - 24)
+        canvas.text(name_x, y - 16, fit_text(item, 'F2', 12, name_width), 'F2', 12, 0.0)
+        canvas.text(name_x, y - 30, f"Qty: {qty} × {format_sen(price_sen)}", 'F1', 10, MUTED)
+        canvas.text_right(MARGIN_RIGHT, y - 23, format_sen(price_sen * qty), 'F2', 12, 0.0)
+        canvas.rule(y - ITEM_ROW_HEIGHT + 2, 0.5, RULE)
+        y -= ITEM_ROW_HEIGHT
+    
+    # Total and footer
+    if y - TOTAL_SECTION_HEIGHT - 30 < MARGIN_BOTTOM:
+        new_page()
+    canvas.rule(y - 16, 2)
+    canvas.text_right(MARGIN_RIGHT, y - 46, f"TOTAL: {format_sen(total_sen)}", 'F2', 20, DARK)
+    canvas.text_centre(MARGIN_BOTTOM - 4, "Happy Shopping!", 'F3', 11, MUTED)
+    
+    # Page numbers once the page count is known
+    for number, page in enumerate(pages, 1):
+        page.text_right(MARGIN_RIGHT, MARGIN_BOTTOM - 28, f"Page {number} of {len(pages)}", 'F1', 8, MUTED)
+    return pages
+
+def write_pdf(pages):
+    """Serialise laid-out pages into a PDF file (bytes)"""
+    objects = []
+    
+    def add(body):
+        objects.append(body)
+        return len(objects)
+    
+    catalog = add(None)
+    page_tree = add(None)
+    font_refs = b' '.join(b'/%s %d 0 R' % (name.encode(), add(b'<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>' % base.encode()))
+                          for name, base in FONTS.items())
+    
+    kids = []
+    for page in pages:
+        stream = zlib.compress(page.content())
+        content = add(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(stream), stream))
+        kids.append(add(b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources << /Font << %s >> >> /Contents %d 0 R >>'
+                        % (page_tree, PAGE_WIDTH, PAGE_HEIGHT, font_refs, content)))
+    objects[catalog - 1] = b'<< /Type /Catalog /Pages %d 0 R >>' % page_tree
+    objects[page_tree - 1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(b'%d 0 R' % kid for kid in kids), len(kids))
+    
+    out = [b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n']
+    offsets = []
+    position = len(out[0])
+    for number, body in enumerate(objects, 1):
+        chunk = b'%d 0 obj\n%s\nendobj\n' % (number, body)
+        offsets.append(position)
+        out.append(chunk)
+        position += len(chunk)
+    out.append(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    out.extend(b'%010d 00000 n \n' % offset for offset in offsets)
+    out.append(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, catalog, position))
+    return b''.join(out)
+
+def render_shopping_list_pdf(lines, total_sen, generated, title="GROCERY SHOPPING LIST", date_label="Generated", checkboxes=True):
+    """PDF bytes for a shopping list with the same layout as the HTML export"""
+    return write_pdf(layout_document(lines, total_sen, generated, title, date_label, checkboxes))
+
+def render_receipt_pdf(lines, total_sen, purchased):
+    """PDF bytes for a past purchase"""
+    return render_shopping_list_pdf(lines, total_sen, purchased, title="PURCHASE RECEIPT", date_label="Purchased", checkboxes=False)
+
+def render_job(job):
+    """Render one batch job: ('list' | 'receipt', lines, total_sen, date)"""
+    kind, lines, total_sen, when = job
+    if kind == 'receipt':
+        return render_receipt_pdf(lines, total_sen, when)
+    return render_shopping_list_pdf(lines, total_sen, when)
+
+# Below this many jobs, starting worker processes costs more than it saves
+PDF_POOL_MIN_JOBS = 32
+
+def make_pdf_pool(workers=None):
+    """Process pool for render_pdf_batch ('spawn' workers only need this module, and are safe to start from a threaded server)"""
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, mp_context=multiprocessing.get_context('spawn'))
+
+def render_pdf_batch(jobs, workers=None, pool=None, chunksize=16):
+    """Render many shopping lists / receipts in parallel, returning PDF bytes in job order.
+    
+    Pass a long-lived `pool` from make_pdf_pool() to skip worker start-up;
+    otherwise a pool of `workers` processes is created for this batch.
+    """
+    jobs = list(jobs)
+    single_process = pool is None and (workers or os.cpu_count() or 1) == 1
+    if single_process or len(jobs) < PDF_POOL_MIN_JOBS:
+        return [render_job(job) for job in jobs]
+    
+    if pool is not None:
+        return list(pool.map(render_job, jobs, chunksize=chunksize))
+    with make_pdf_pool(workers) as pool:
+        return list(pool.map(render_job, jobs, chunksize=chunksize))
+
+def count_pages(pdf):
+    """Number of pages in a PDF produced by write_pdf"""
+    return pdf.count(b'/Type /Page ')
+
+def benchmark(documents=500, items=30, workers=None):
+    """Render a batch of synthetic lists and report pages per second (cold and warm pool)"""
+    lines = tuple((f"Grocery item {i} (1kg)", 150 + i % 20 * 100, 1 + i % 4) for i in range(items))
+    total_sen = sum(price_sen * qty for item, price_sen, qty in lines)
+    generated = datetime.now().strftime('%Y-%m-%d %H:%M')
+    jobs = [('list', lines, total_sen, generated)] * documents
+    workers = workers or os.cpu_count() or 1
+    
+    with make_pdf_pool(workers) as pool:
+        for run in ('cold', 'warm'):
+            start = time.perf_counter()
+            pdfs = render_pdf_batch(jobs, pool=pool)
+            elapsed = time.perf_counter() - start
+            pages = sum(count_pages(pdf) for pdf in pdfs)
+            print(f"{documents} lists x {items} items, {workers} worker(s), {run} pool: "
+                  f"{pages} pages in {elapsed:.2f}s = {pages / elapsed:.0f} pages/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the PDF shopping list renderer")
+    parser.add_argument('--documents', type=int, default=500)
+    parser.add_argument('--items', type=int, default=30)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    benchmark(args.documents, args.items, args.workers)
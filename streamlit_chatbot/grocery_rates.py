@@ -0,0 +1,436 @@
+"""Exchange-rate providers: a pooled HTTP client with retries and a circuit
+breaker, plus a local stand-in for the rate API.
+
+Kept out of grocery_streamlit3.py so load tests and CI can run the stand-in
+server without starting the Streamlit app:
+
+    python grocery_rates.py serve --port 8765 --latency 0.2 --failure-rate 0.1
+    GROCERY_RATES_URL=http://127.0.0.1:8765/v4/latest/MYR streamlit run grocery_streamlit3.py
+    python grocery_rates.py drill
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+# exchangerate-api.com free tier (1500 requests/month)
+DEFAULT_RATES_URL = "https://api.exchangerate-api.com/v4/latest/MYR"
+RATES_URL = os.environ.get('GROCERY_RATES_URL', DEFAULT_RATES_URL)
+
+# Recorded API responses served by the stand-in server
+RATE_FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rate_fixtures.json')
+
+# Every fetched rate snapshot is kept here for as-of lookups
+RATE_HISTORY_DB_PATH = os.environ.get(
+    'GROCERY_RATES_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'grocery_rates.db')
+)
+
+RATE_HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_currencies (
+    position INTEGER PRIMARY KEY,
+    code TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS rate_snapshots (
+    fetched_at INTEGER PRIMARY KEY,
+    rates BLOB NOT NULL
+);
+"""
+
+# Per-request timeout, retry schedule and circuit breaker settings
+REQUEST_TIMEOUT_SECONDS = 5
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY_SECONDS = 0.5
+RETRY_MAX_DELAY_SECONDS = 8
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 300
+
+class RateProviderError(Exception):
+    """A provider could not return exchange rates"""
+
+class CircuitOpenError(RateProviderError):
+    """The circuit breaker is open, so the upstream was not called"""
+
+class PermanentRateError(RateProviderError):
+    """The upstream rejected the request itself (HTTP 4xx), so retrying will not help"""
+
+# 4xx answers that mean "try again later" rather than "this request is wrong"
+RETRYABLE_CLIENT_STATUSES = (408, 429)
+
+class RateProvider:
+    """Source of exchange rates from MYR: fetch() returns {currency: rate} or raises RateProviderError"""
+    
+    name = "provider"
+    
+    def fetch(self):
+        raise NotImplementedError
+
+class HttpRateProvider(RateProvider):
+    """exchangerate-api.com style JSON endpoint ({"rates": {...}}) over a keep-alive session"""
+    
+    def __init__(self, url=RATES_URL, timeout=REQUEST_TIMEOUT_SECONDS, pool_size=4):
+        self.url = url
+        self.name = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+    
+    def fetch(self):
+        try:
+            response = self.session.get(self.url, timeout=self.timeout)
+        except requests.RequestException as error:
+            raise RateProviderError(f"{self.url}: {error}") from error
+        if 400 <= response.status_code < 500 and response.status_code not in RETRYABLE_CLIENT_STATUSES:
+            raise PermanentRateError(f"{self.url}: HTTP {response.status_code}")
+        if response.status_code != 200:
+            raise RateProviderError(f"{self.url}: HTTP {response.status_code}")
+        try:
+            rates = response.json()['rates']
+        except (ValueError, KeyError, TypeError) as error:
+            raise RateProviderError(f"{self.url}: unexpected response") from error
+        if not isinstance(rates, dict) or not rates:
+            raise RateProviderError(f"{self.url}: no rates in response")
+        return rates
+
+class FixtureRateProvider(RateProvider):
+    """Recorded rates from a fixture file, without any network"""
+    
+    name = "fixtures"
+    
+    def __init__(self, path=RATE_FIXTURES_PATH, base='MYR'):
+        with open(path, encoding='utf-8') as fixture_file:
+            self.rates = json.load(fixture_file)[base]['rates']
+    
+    def fetch(self):
+        return dict(self.rates)
+
+class CircuitBreaker:
+    """Stop calling an upstream after repeated failures.
+    
+    After `threshold` consecutive failures the circuit opens and calls are
+    refused for `reset_after` seconds. Then one trial call is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+    
+    def __init__(self, threshold=BREAKER_FAILURE_THRESHOLD, reset_after=BREAKER_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.trial_thread = None
+    
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_after:
+            return 'open'
+        return 'half-open'
+    
+    def allow(self):
+        """Whether a call may go upstream now"""
+        with self.lock:
+            state = self.state()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.trial_running:
+                self.trial_running = True
+                self.trial_thread = threading.get_ident()
+                return True
+            return False
+    
+    def end_trial(self):
+        """Give up a half-open trial this thread started, however its call ended"""
+        with self.lock:
+            if self.trial_running and self.trial_thread == threading.get_ident():
+                self.trial_running = False
+    
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+    
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY_SECONDS, cap=RETRY_MAX_DELAY_SECONDS):
+    """Exponential backoff with full jitter for the given retry (0 = first retry)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class ResilientRateProvider(RateProvider):
+    """Wrap a provider with retries (exponential backoff + jitter) and a circuit breaker.
+    
+    PermanentRateError (a 4xx answer) is raised at once: the upstream is up,
+    so it counts as a success for the breaker, and asking again will not
+    change the answer.
+    """
+    
+    def __init__(self, provider, attempts=RETRY_ATTEMPTS, breaker=None, sleep=time.sleep):
+        self.provider = provider
+        self.name = provider.name
+        self.attempts = attempts
+        self.breaker = breaker or CircuitBreaker()
+        self.sleep = sleep
+    
+    def fetch(self):
+        # Kept local: one provider serves every session's thread and the refresher
+        last_error = None
+        for attempt in range(self.attempts):
+            if attempt:
+                self.sleep(backoff_delay(attempt - 1))
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"{self.name}: circuit open after repeated failures")
+            try:
+                rates = self.provider.fetch()
+            except PermanentRateError as error:
+                self.breaker.record_success()
+                raise
+            except RateProviderError as error:
+                self.breaker.record_failure()
+                last_error = error
+                continue
+            else:
+                self.breaker.record_success()
+                return rates
+            finally:
+                # Any other exception must not leave a half-open trial running for good
+                self.breaker.end_trial()
+        raise last_error
+
+def make_rate_provider(url=RATES_URL):
+    """The provider the app uses: 'fixtures' for recorded rates, otherwise an HTTP endpoint"""
+    if url == 'fixtures':
+        return ResilientRateProvider(FixtureRateProvider())
+    return ResilientRateProvider(HttpRateProvider(url))
+
+class RateHistory:
+    """Append-only time series of rate snapshots with "rate as of time T" lookups.
+
+    Currencies get a fixed column position the first time they are seen.
+    Each snapshot is stored as (epoch seconds, float64 array in column
+    order) in SQLite, and kept in memory as a sorted timestamp vector plus
+    a snapshots x currencies matrix, so as-of lookups for many timestamps
+    are one np.searchsorted call. Currencies missing from a snapshot are NaN.
+    """
+    
+    def __init__(self, path=RATE_HISTORY_DB_PATH):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(RATE_HISTORY_SCHEMA)
+        
+        self.currencies = [code for code, in self.conn.execute('SELECT code FROM rate_currencies ORDER BY position')]
+        self.positions = {code: position for position, code in enumerate(self.currencies)}
+        rows = self.conn.execute('SELECT fetched_at, rates FROM rate_snapshots ORDER BY fetched_at').fetchall()
+        self.timestamps = np.array([fetched_at for fetched_at, blob in rows], dtype=np.int64)
+        self.matrix = np.full((len(rows), len(self.currencies)), np.nan)
+        for row, (fetched_at, blob) in enumerate(rows):
+            values = np.frombuffer(blob, dtype=np.float64)
+            self.matrix[row, :len(values)] = values
+    
+    def __len__(self):
+        return len(self.timestamps)
+    
+    def append(self, fetched_at, rates):
+        """Record the rates fetched at epoch second `fetched_at` (a later call for the same second replaces it)"""
+        fetched_at = int(fetched_at)
+        with self.lock:
+            new_codes = [code for code in rates if code not in self.positions]
+            for code in new_codes:
+                self.positions[code] = len(self.currencies)
+                self.currencies.append(code)
+            values = np.full(len(self.currencies), np.nan)
+            for code, rate in rates.items():
+                values[self.positions[code]] = rate
+            
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.executemany(
+                    'INSERT OR IGNORE INTO rate_currencies (position, code) VALUES (?, ?)',
+                    ((self.positions[code], code) for code in new_codes)
+                )
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO rate_snapshots (fetched_at, rates) VALUES (?, ?)',
+                    (fetched_at, values.tobytes())
+                )
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            
+            # Snapshots normally arrive in time order, so this is an append
+            if new_codes:
+                self.matrix = np.hstack([self.matrix, np.full((len(self.matrix), len(new_codes)), np.nan)])
+            row = int(np.searchsorted(self.timestamps, fetched_at))
+            if row < len(self.timestamps) and self.timestamps[row] == fetched_at:
+                self.matrix[row] = values
+            else:
+                self.timestamps = np.insert(self.timestamps, row, fetched_at)
+                self.matrix = np.insert(self.matrix, row, values, axis=0)
+    
+    def as_of(self, currency, timestamps, before_first='earliest'):
+        """Rate of `currency` in force at each epoch timestamp (NaN where unknown).
+
+        Times before the first snapshot get the earliest known rate, or NaN
+        when before_first is None.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        with self.lock:
+            position = self.positions.get(currency)
+            if position is None or not len(self.timestamps):
+                return np.full(timestamps.shape, np.nan)
+            column = self.matrix[:, position]
+            rows = np.searchsorted(self.timestamps, timestamps, side='right') - 1
+        
+        rates = column[np.maximum(rows, 0)]
+        if before_first is None:
+            rates = np.where(rows >= 0, rates, np.nan)
+        return rates
+
+class StandInRatesHandler(BaseHTTPRequestHandler):
+    """Serves /v4/latest/<BASE> from the fixtures, with injected latency and failures"""
+    
+    fixtures = {}
+    latency = 0.0
+    failure_rate = 0.0
+    failure_status = 503
+    
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            self.send_json(self.failure_status, {'result': 'error', 'error-type': 'injected-failure'})
+            return
+        base = self.path.rstrip('/').rsplit('/', 1)[-1].upper()
+        if not self.path.startswith('/v4/latest/') or base not in self.fixtures:
+            self.send_json(404, {'result': 'error', 'error-type': 'unsupported-code'})
+            return
+        self.send_json(200, dict(self.fixtures[base], time_last_updated=int(time.time())))
+    
+    def send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def log_message(self, format, *args):
+        pass
+
+def make_stand_in_server(port=8765, latency=0.0, failure_rate=0.0, fixtures_path=RATE_FIXTURES_PATH, host='127.0.0.1'):
+    """Threaded stand-in rate server (port 0 picks a free port); call serve_forever() on it"""
+    with open(fixtures_path, encoding='utf-8') as fixture_file:
+        fixtures = json.load(fixture_file)
+    handler = type('ConfiguredStandInRatesHandler', (StandInRatesHandler,), {
+        'fixtures': fixtures,
+        'latency': latency,
+        'failure_rate': failure_rate,
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+class CountingProvider(RateProvider):
+    """Pass-through provider that counts the calls reaching the upstream"""
+    
+    def __init__(self, provider):
+        self.provider = provider
+        self.name = provider.name
+        self.calls = 0
+    
+    def fetch(self):
+        self.calls += 1
+        return self.provider.fetch()
+
+class BrokenProvider(RateProvider):
+    """Provider with a bug: fails with something other than RateProviderError"""
+    
+    name = "broken"
+    
+    def fetch(self):
+        raise RuntimeError("provider bug")
+
+def breaker_drill(reset_after=0.5, threshold=RETRY_ATTEMPTS):
+    """Drive the retrying provider against the stand-in server through every
+    breaker state and check each step; raises AssertionError on a bad step."""
+    server = make_stand_in_server(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    handler = server.RequestHandlerClass
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v4/latest/"
+    breaker = CircuitBreaker(threshold, reset_after)
+    
+    def step(label, upstream, expected_outcome, expected_calls, expected_state):
+        provider = ResilientRateProvider(upstream, breaker=breaker, sleep=lambda seconds: None)
+        calls_before = getattr(upstream, 'calls', 0)
+        try:
+            provider.fetch()
+            outcome = 'rates'
+        except (RateProviderError, RuntimeError) as error:
+            outcome = type(error).__name__
+        calls = getattr(upstream, 'calls', 0) - calls_before
+        print(f"{label:<36} {outcome:<19} upstream calls: {calls}  breaker: {breaker.state()}")
+        assert (outcome, calls, breaker.state()) == (expected_outcome, expected_calls, expected_state), label
+    
+    rates = CountingProvider(HttpRateProvider(base_url + 'MYR'))
+    try:
+        step("healthy upstream", rates, 'rates', 1, 'closed')
+        handler.failure_rate = 1.0
+        step("upstream down: retries, then opens", rates, 'RateProviderError', threshold, 'open')
+        step("open: refused without a call", rates, 'CircuitOpenError', 0, 'open')
+        time.sleep(reset_after)
+        step("half-open trial fails: opens again", rates, 'CircuitOpenError', 1, 'open')
+        time.sleep(reset_after)
+        handler.failure_rate = 0.0
+        step("half-open trial succeeds: closes", rates, 'rates', 1, 'closed')
+        step("HTTP 404: not retried", CountingProvider(HttpRateProvider(base_url + 'XXX')),
+             'PermanentRateError', 1, 'closed')
+        
+        breaker.opened_at = time.monotonic() - reset_after
+        step("half-open trial hits a bug", BrokenProvider(), 'RuntimeError', 0, 'half-open')
+        assert not breaker.trial_running, "a failed trial must not stay running"
+        step("next trial still allowed: closes", rates, 'rates', 1, 'closed')
+    finally:
+        server.shutdown()
+        server.server_close()
+    print("Circuit breaker drill passed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the exchange-rate API")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    serve = subcommands.add_parser('serve', help="serve recorded rates over HTTP")
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--latency', type=float, default=0.0, help="seconds to wait before each response")
+    serve.add_argument('--failure-rate', type=float, default=0.0, help="fraction of requests answered with HTTP 503")
+    serve.add_argument('--fixtures', default=RATE_FIXTURES_PATH)
+    fetch = subcommands.add_parser('fetch', help="fetch rates once through the provider layer")
+    fetch.add_argument('--url', default=RATES_URL)
+    drill = subcommands.add_parser('drill', help="run the stand-in server through every circuit breaker state")
+    drill.add_argument('--reset-after', type=float, default=0.5, help="seconds the circuit stays open")
+    args = parser.parse_args()
+    
+    if args.command == 'serve':
+        server = make_stand_in_server(args.port, args.latency, args.failure_rate, args.fixtures)
+        print(f"Serving rates on http://127.0.0.1:{server.server_address[1]}/v4/latest/MYR")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    elif args.command == 'drill':
+        breaker_drill(args.reset_after)
+    else:
+        print(json.dumps(make_rate_provider(args.url).fetch(), indent=2, sort_keys=True))
@@ -1,38 +1,194 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+import numpy as np
+import altair as alt
+from datetime import datetime, date
 import base64
-import requests
+import html
+import io
 import json
+import logging
+import re
+import bisect
+import heapq
+import sqlite3
+import threading
+import time
+import uuid
+import zipfile
+from collections import Counter
+from collections.abc import Mapping
+from types import MappingProxyType
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from itertools import chain
+from grocery_pdf import make_pdf_pool, render_shopping_list_pdf, render_pdf_batch, unencodable_names
+from grocery_export import (
+    EXPORT_FORMATS, CART_COLUMNS, CATALOG_COLUMNS, PURCHASE_LINE_COLUMNS,
+    cart_batches, catalog_batches, purchase_line_batches, iter_export, default_catalog_db_path
+)
+from grocery_rates import RateHistory, RateProviderError, make_rate_provider
+from grocery_classify import CATEGORY_KEYWORDS, classify_item_name
+from grocery_household import CartConflict, HouseholdCartView, HouseholdCarts
+from grocery_import import IMPORT_FORMATS, ImportReport, import_format_for, iter_price_batches
 
-def get_exchange_rates():
-    """Fetch real-time exchange rates from MYR to other currencies"""
-    try:
-        # Using exchangerate-api.com (free tier allows 1500 requests/month)
-        url = "https://api.exchangerate-api.com/v4/latest/MYR"
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            return data['rates']
-        else:
-            return None
-    except:
-        return None
+@st.cache_resource
+def get_rate_provider():
+    """One pooled, retrying rate provider for the whole server (GROCERY_RATES_URL picks the endpoint)"""
+    return make_rate_provider()
 
-def get_cached_exchange_rates():
-    """Get exchange rates with caching to avoid too many API calls"""
-    if 'exchange_rates' not in st.session_state or 'rates_timestamp' not in st.session_state:
-        st.session_state.exchange_rates = get_exchange_rates()
-        st.session_state.rates_timestamp = datetime.now()
-        return st.session_state.exchange_rates
+@st.cache_resource
+def get_rate_history():
+    """Every rate snapshot the server has fetched, for converting at past rates"""
+    return RateHistory()
+
+def get_exchange_rates(provider, rate_history=None):
+    """Fetch real-time exchange rates from MYR to other currencies, keeping the snapshot
+    (raises RateProviderError when the fetch fails)"""
+    rates = provider.fetch()
+    if rate_history is not None:
+        rate_history.append(time.time(), rates)
+    return rates
+
+# How long fetched rates stay fresh, how long before expiry the background
+# refresher fetches new ones, and how long it waits after a failed fetch
+# (the free API tier allows 1500 requests a month)
+RATES_TTL_SECONDS = 30 * 60
+RATES_REFRESH_AHEAD_SECONDS = 5 * 60
+RATES_RETRY_SECONDS = 60
+
+class ExchangeRateCache:
+    """Exchange rates shared read-only by every session in the server process.
+
+    A background thread fetches new rates shortly before they expire, so
+    readers never wait on the API: get() returns the last good rates at
+    once, however old they are. Only one fetch runs at a time; a manual
+    refresh() that arrives during a background fetch waits for it instead
+    of calling the API again (single flight). A failed fetch keeps the
+    last good rates and is retried after a short delay.
+    """
+    
+    def __init__(self, fetch, ttl=RATES_TTL_SECONDS, refresh_ahead=RATES_REFRESH_AHEAD_SECONDS, retry_after=RATES_RETRY_SECONDS):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.in_flight = None
+        # (rates, fetched at) replaced in one assignment, so readers always get a matching pair
+        self.snapshot = (None, None)
+        self.expires = 0.0
+        self.next_refresh = 0.0
+        self.failed = False
+        # Why the last fetch failed, set with `failed` under the lock
+        self.last_error = None
+        self.stopping = threading.Event()
+        self.refresher = None
+    
+    def start(self):
+        """Start the background refresher (the first fetch begins immediately)"""
+        if self.refresher is None:
+            self.refresher = threading.Thread(target=self.run_refresher, name="exchange-rate-refresher", daemon=True)
+            self.refresher.start()
+        return self
+    
+    def stop(self):
+        self.stopping.set()
+    
+    def run_refresher(self):
+        while not self.stopping.wait(max(0.0, self.next_refresh - time.monotonic())):
+            if time.monotonic() >= self.next_refresh:
+                try:
+                    self.refresh()
+                except Exception:
+                    # refresh() has already scheduled a retry; keep the thread alive
+                    logging.exception("Exchange rate refresh failed, retrying in %d s", self.retry_after)
+    
+    def get(self):
+        """(last good rates as a read-only mapping, datetime they were fetched) without
+        waiting; (None, None) before the first fetch"""
+        return self.snapshot
+    
+    @property
+    def rates(self):
+        return self.snapshot[0]
+    
+    def is_stale(self):
+        """True when the rates are past their TTL (the last refreshes failed)"""
+        return self.rates is not None and time.monotonic() >= self.expires
+    
+    def is_fetching(self):
+        return self.in_flight is not None
     
-    # Refresh rates every 30 minutes
-    time_diff = datetime.now() - st.session_state.rates_timestamp
-    if time_diff.seconds > 1800:  # 30 minutes
-        st.session_state.exchange_rates = get_exchange_rates()
-        st.session_state.rates_timestamp = datetime.now()
+    def failure(self):
+        """The error that made the last fetch fail, or None if it succeeded"""
+        with self.lock:
+            return self.last_error if self.failed else None
     
-    return st.session_state.exchange_rates
+    def refresh(self):
+        """Fetch new rates now, or join a fetch already running.
+
+        Returns the new rates, or None if the fetch failed (failure() says why).
+        """
+        with self.lock:
+            in_flight = self.in_flight
+            if in_flight is None:
+                in_flight = self.in_flight = threading.Event()
+                leader = True
+            else:
+                leader = False
+        
+        if not leader:
+            in_flight.wait()
+            return None if self.failed else self.rates
+        
+        rates = error = None
+        try:
+            rates = self.fetch()
+        except RateProviderError as fetch_error:
+            error = fetch_error
+        finally:
+            with self.lock:
+                if rates:
+                    self.snapshot = (MappingProxyType(dict(rates)), datetime.now())
+                    self.expires = time.monotonic() + self.ttl
+                    self.next_refresh = self.expires - self.refresh_ahead
+                    self.failed = False
+                    self.last_error = None
+                else:
+                    self.failed = True
+                    self.last_error = error
+                    self.next_refresh = time.monotonic() + self.retry_after
+                self.in_flight = None
+            in_flight.set()
+        return self.rates if rates else None
+
+@st.cache_resource
+def get_rate_cache():
+    """One exchange-rate cache for the whole server, kept fresh in the background"""
+    return ExchangeRateCache(partial(get_exchange_rates, get_rate_provider(), get_rate_history())).start()
+
+def get_cached_exchange_rates():
+    """(rates, fetched at) as last fetched, without waiting for the API"""
+    return get_rate_cache().get()
+
+def show_rate_failure():
+    """Caption with the reason the last exchange-rate fetch failed, if any"""
+    error = get_rate_cache().failure()
+    if error is not None:
+        st.caption(f"Reason: {error}")
+
+def format_age(when):
+    """Short 'x min ago' text for a past datetime"""
+    minutes = int((datetime.now() - when).total_seconds() // 60)
+    if minutes < 1:
+        return "just now"
+    if minutes < 60:
+        return f"{minutes} min ago"
+    hours = minutes // 60
+    if hours < 48:
+        return f"{hours} h ago"
+    return f"{hours // 24} days ago"
 
 def convert_currency(amount_myr, target_currency, rates):
     """Convert MYR amount to target currency"""
@@ -40,295 +196,1537 @@ def convert_currency(amount_myr, target_currency, rates):
         return amount_myr * rates[target_currency]
     return None
 
+# Currencies offered in the sidebar and on the Currency Info tab
+POPULAR_CURRENCIES = ['USD', 'EUR', 'GBP', 'SGD', 'THB', 'IDR', 'JPY', 'CNY', 'AUD', 'INR']
+
+CURRENCY_SYMBOLS = {
+    'USD': '$',
+    'EUR': '€',
+    'GBP': '£',
+    'SGD': 'S$',
+    'THB': '฿',
+    'IDR': 'Rp',
+    'JPY': '¥',
+    'CNY': '¥',
+    'AUD': 'A$',
+    'CAD': 'C$',
+    'INR': '₹'
+}
+
+# Currencies shown without decimals
+WHOLE_UNIT_CURRENCIES = {'JPY', 'IDR'}
+
+@lru_cache(maxsize=None)
+def currency_format(currency_code):
+    """(symbol, printf-style number format) for a currency, worked out once"""
+    symbol = CURRENCY_SYMBOLS.get(currency_code, currency_code + ' ')
+    return symbol, '%.0f' if currency_code in WHOLE_UNIT_CURRENCIES else '%.2f'
+
 def format_currency(amount, currency_code):
     """Format currency with appropriate symbol"""
-    currency_symbols = {
-        'USD': '$',
-        'EUR': '€',
-        'GBP': '£',
-        'SGD': 'S$',
-        'THB': '฿',
-        'IDR': 'Rp',
-        'JPY': '¥',
-        'CNY': '¥',
-        'AUD': 'A$',
-        'CAD': 'C$',
-        'INR': '₹'
-    }
+    symbol, number_format = currency_format(currency_code)
+    return symbol + number_format % amount
+
+def format_currency_array(amounts, currency_code):
+    """Format many amounts in one currency with one precomputed format string"""
+    symbol, number_format = currency_format(currency_code)
+    amount_format = symbol.replace('%', '%%') + number_format
+    return [amount_format % amount for amount in np.asarray(amounts, dtype=np.float64).tolist()]
+
+# Label tables kept (catalog version x rates snapshot x currency)
+PRICE_LABEL_CACHE_ENTRIES = 8
+
+@st.cache_resource(max_entries=PRICE_LABEL_CACHE_ENTRIES, show_spinner=False)
+def catalog_price_labels(catalog_version, rates_fetched_at, currency, _rows, _rate):
+    """{item: (RM price, ' (converted price)')} for the whole catalog in one currency"""
+    symbol, number_format = currency_format(currency)
+    label_format = f" ({symbol.replace('%', '%%')}{number_format})"
+    return {name: (price, label_format % (price * _rate)) for name, price in _rows}
+
+class PriceLabels:
+    """Converted-price text for the currency picked in the sidebar.
+
+    The catalog's label table for that currency is built (or fetched from
+    the shared cache) the first time an item label is asked for; prices
+    that are not in it (edited cart lines, subtotals, totals, prices changed
+    since the table was built) are converted on the spot.
+    """
     
-    symbol = currency_symbols.get(currency_code, currency_code + ' ')
+    def __init__(self, currency, rates, rates_fetched_at=None, catalog=None):
+        self.currency = currency
+        self.rates = rates
+        self.rates_fetched_at = rates_fetched_at
+        self.catalog = catalog
+        self.labels = None
+        self.active = currency != 'MYR (Default)' and bool(rates) and currency in rates
     
-    if currency_code == 'JPY' or currency_code == 'IDR':
-        return f"{symbol}{amount:.0f}"
-    else:
-        return f"{symbol}{amount:.2f}"
+    @classmethod
+    def for_catalog(cls, catalog, currency, rates, rates_fetched_at):
+        """Labels for catalog items; rates and rates_fetched_at must come from one
+        ExchangeRateCache.get() so the shared table is keyed on the rates it holds"""
+        return cls(currency, rates, rates_fetched_at, catalog)
+    
+    def item(self, item, price):
+        """' (converted price)' for a catalog item, or '' when showing MYR only"""
+        if not self.active:
+            return ''
+        if self.labels is None:
+            self.labels = catalog_price_labels(
+                self.catalog.version(), self.rates_fetched_at, self.currency,
+                self.catalog.listing(), self.rates[self.currency]
+            ) if self.catalog is not None else {}
+        entry = self.labels.get(item)
+        if entry is None or entry[0] != price:
+            return f" ({self.amount(price)})"
+        return entry[1]
+    
+    def amount(self, amount):
+        """One MYR amount in the selected currency"""
+        return format_currency(amount * self.rates[self.currency], self.currency)
+    
+    def amounts(self, amounts):
+        """Many MYR amounts in the selected currency"""
+        converted = np.asarray(amounts, dtype=np.float64) * self.rates[self.currency]
+        return format_currency_array(converted, self.currency)
+
+# Money is kept as whole sen (1/100 RM) in int64 so totals add up exactly;
+# RM floats only appear where prices come in and where amounts are shown
+SEN_PER_RINGGIT = 100
+
+def to_sen(amount):
+    """An RM amount as a whole number of sen"""
+    return int(round(amount * SEN_PER_RINGGIT))
+
+def format_rm(sen):
+    """'RM12.34' for an amount in sen (exact, no float rounding)"""
+    sign = '-' if sen < 0 else ''
+    ringgit, cents = divmod(abs(int(sen)), SEN_PER_RINGGIT)
+    return f"{sign}RM{ringgit}.{cents:02d}"
+
+# Starting catalog written to the store the first time it is opened
+DEFAULT_GROCERY_ITEMS = {
+    # Rice & Grains
+    'Basmati Rice (5kg)': 25.90,
+    'Jasmine Rice (10kg)': 42.00,
+    'Brown Rice (2kg)': 18.50,
+    'Instant Oats (1kg)': 12.80,
+    'Bread (White)': 2.50,
+    'Wholemeal Bread': 3.20,
+    
+    # Proteins
+    'Chicken Breast (1kg)': 18.90,
+    'Chicken Thigh (1kg)': 12.50,
+    'Beef (1kg)': 32.00,
+    'Fish - Mackerel (1kg)': 15.00,
+    'Fish - Salmon (500g)': 28.00,
+    'Eggs (30pcs)': 12.50,
+    'Tofu (500g)': 3.50,
+    
+    # Dairy
+    'Fresh Milk (1L)': 4.20,
+    'UHT Milk (1L)': 3.80,
+    'Yogurt (500g)': 8.90,
+    'Cheese Slices (200g)': 7.50,
+    'Butter (250g)': 6.80,
+    
+    # Vegetables
+    'Potatoes (1kg)': 4.50,
+    'Onions (1kg)': 5.20,
+    'Carrots (1kg)': 6.80,
+    'Cabbage (1pc)': 3.50,
+    'Tomatoes (1kg)': 7.20,
+    'Cucumbers (1kg)': 4.80,
+    'Spinach (bunch)': 2.50,
+    'Broccoli (500g)': 5.90,
+    
+    # Fruits
+    'Bananas (1kg)': 4.20,
+    'Apples (1kg)': 8.90,
+    'Oranges (1kg)': 6.50,
+    'Watermelon (1pc)': 8.00,
+    'Papaya (1pc)': 5.50,
+    'Mangoes (1kg)': 12.00,
+    
+    # Pantry Staples
+    'Cooking Oil (2L)': 12.90,
+    'Soy Sauce (500ml)': 4.50,
+    'Salt (1kg)': 1.80,
+    'Sugar (1kg)': 2.60,
+    'Flour (1kg)': 3.20,
+    'Garlic (500g)': 8.00,
+    'Ginger (500g)': 6.50,
+    
+    # Beverages
+    'Coffee (200g)': 15.80,
+    'Tea Bags (25pcs)': 4.90,
+    'Fruit Juice (1L)': 5.50,
+    'Mineral Water (1.5L)': 1.20,
+    
+    # Household
+    'Dishwashing Liquid': 4.80,
+    'Laundry Detergent': 18.50,
+    'Toilet Paper (12 rolls)': 15.90,
+    'Shampoo (400ml)': 12.80,
+}
 
 def load_default_items():
-    """Load default grocery items"""
-    st.session_state.grocery_items = {
-        # Rice & Grains
-        'Basmati Rice (5kg)': 25.90,
-        'Jasmine Rice (10kg)': 42.00,
-        'Brown Rice (2kg)': 18.50,
-        'Instant Oats (1kg)': 12.80,
-        'Bread (White)': 2.50,
-        'Wholemeal Bread': 3.20,
-        
-        # Proteins
-        'Chicken Breast (1kg)': 18.90,
-        'Chicken Thigh (1kg)': 12.50,
-        'Beef (1kg)': 32.00,
-        'Fish - Mackerel (1kg)': 15.00,
-        'Fish - Salmon (500g)': 28.00,
-        'Eggs (30pcs)': 12.50,
-        'Tofu (500g)': 3.50,
-        
-        # Dairy
-        'Fresh Milk (1L)': 4.20,
-        'UHT Milk (1L)': 3.80,
-        'Yogurt (500g)': 8.90,
-        'Cheese Slices (200g)': 7.50,
-        'Butter (250g)': 6.80,
-        
-        # Vegetables
-        'Potatoes (1kg)': 4.50,
-        'Onions (1kg)': 5.20,
-        'Carrots (1kg)': 6.80,
-        'Cabbage (1pc)': 3.50,
-        'Tomatoes (1kg)': 7.20,
-        'Cucumbers (1kg)': 4.80,
-        'Spinach (bunch)': 2.50,
-        'Broccoli (500g)': 5.90,
-        
-        # Fruits
-        'Bananas (1kg)': 4.20,
-        'Apples (1kg)': 8.90,
-        'Oranges (1kg)': 6.50,
-        'Watermelon (1pc)': 8.00,
-        'Papaya (1pc)': 5.50,
-        'Mangoes (1kg)': 12.00,
-        
-        # Pantry Staples
-        'Cooking Oil (2L)': 12.90,
-        'Soy Sauce (500ml)': 4.50,
-        'Salt (1kg)': 1.80,
-        'Sugar (1kg)': 2.60,
-        'Flour (1kg)': 3.20,
-        'Garlic (500g)': 8.00,
-        'Ginger (500g)': 6.50,
-        
-        # Beverages
-        'Coffee (200g)': 15.80,
-        'Tea Bags (25pcs)': 4.90,
-        'Fruit Juice (1L)': 5.50,
-        'Mineral Water (1.5L)': 1.20,
-        
-        # Household
-        'Dishwashing Liquid': 4.80,
-        'Laundry Detergent': 18.50,
-        'Toilet Paper (12 rolls)': 15.90,
-        'Shampoo (400ml)': 12.80,
+    """Load default grocery items into the catalog store"""
+    get_catalog_store().upsert_items((name, price, None) for name, price in DEFAULT_GROCERY_ITEMS.items())
+
+class CartLine:
+    """One cart line: unit price in sen and quantity"""
+    
+    __slots__ = ('price_sen', 'quantity')
+    
+    def __init__(self, price_sen, quantity):
+        self.price_sen = price_sen
+        self.quantity = quantity
+    
+    @property
+    def price(self):
+        """Unit price in RM (for display and exports)"""
+        return self.price_sen / SEN_PER_RINGGIT
+    
+    @property
+    def subtotal_sen(self):
+        return self.price_sen * self.quantity
+
+class Cart:
+    """Shopping cart of {item: CartLine} with running totals.
+
+    Every change goes through a method here, which keeps the total
+    quantity, the total cost in sen and an order-independent content hash
+    up to date, so none of them needs a pass over the lines.
+    """
+    
+    def __init__(self):
+        self.lines = {}
+        self.total_quantity = 0
+        self.total_sen = 0
+        self.line_hash_sum = 0
+    
+    def __len__(self):
+        return len(self.lines)
+    
+    def __contains__(self, item):
+        return item in self.lines
+    
+    def __iter__(self):
+        return iter(self.lines)
+    
+    def __getitem__(self, item):
+        return self.lines[item]
+    
+    def items(self):
+        return self.lines.items()
+    
+    @staticmethod
+    def line_hash(item, line):
+        return hash((item, line.price_sen, line.quantity))
+    
+    def count_line(self, item, line, sign):
+        """Add a line into (sign=1) or take it out of (sign=-1) the running totals"""
+        self.total_quantity += sign * line.quantity
+        self.total_sen += sign * line.subtotal_sen
+        self.line_hash_sum = (self.line_hash_sum + sign * self.line_hash(item, line)) & 0xFFFFFFFFFFFFFFFF
+    
+    def add(self, item, price, quantity):
+        """Add a quantity of an item at an RM unit price (the first price added is kept)"""
+        line = self.lines.get(item)
+        if line is None:
+            line = self.lines[item] = CartLine(to_sen(price), 0)
+        else:
+            self.count_line(item, line, -1)
+        line.quantity += quantity
+        self.count_line(item, line, 1)
+    
+    def set_price(self, item, price):
+        """Change an item's unit price (RM) after a catalog edit, if it is in the cart"""
+        line = self.lines.get(item)
+        if line is None:
+            return
+        self.count_line(item, line, -1)
+        line.price_sen = to_sen(price)
+        self.count_line(item, line, 1)
+    
+    def remove(self, item):
+        """Drop an item's line"""
+        line = self.lines.pop(item, None)
+        if line is not None:
+            self.count_line(item, line, -1)
+    
+    def rename(self, old_item, new_item, price):
+        """Move a line to a new item name and price, keeping its quantity"""
+        line = self.lines.get(old_item)
+        if line is None:
+            return
+        self.remove(old_item)
+        self.add(new_item, price, line.quantity)
+    
+    def clear(self):
+        self.lines = {}
+        self.total_quantity = 0
+        self.total_sen = 0
+        self.line_hash_sum = 0
+    
+    def take(self):
+        """Empty the cart, returning a Cart that holds the lines it had"""
+        taken = Cart()
+        taken.lines, taken.total_quantity, taken.total_sen, taken.line_hash_sum = (
+            self.lines, self.total_quantity, self.total_sen, self.line_hash_sum
+        )
+        self.clear()
+        return taken
+    
+    # Only this session changes a private cart, so it is always as last
+    # shown; a household cart view checks these against other members' edits
+    remove_if_unchanged = remove
+    clear_if_unchanged = clear
+    take_if_unchanged = take
+    
+    def content_hash(self):
+        """Hash of the cart contents, kept up to date on every change (same lines, same hash)"""
+        return (len(self.lines), self.total_quantity, self.total_sen, self.line_hash_sum)
+    
+    def export_lines(self):
+        """The cart as a tuple of (item, unit price in sen, quantity) lines"""
+        return tuple((item, line.price_sen, line.quantity) for item, line in self.lines.items())
+
+@st.cache_resource
+def get_household_carts():
+    """Household carts shared by every session on the server"""
+    return HouseholdCarts(Cart)
+
+# Starting number of rows in a purchase log; capacity doubles when full
+PURCHASE_LOG_CHUNK = 64
+
+class PurchaseLog:
+    """Append-only purchase history stored column-wise in NumPy arrays.
+    
+    Every purchased line is one row of (purchase id, epoch timestamp,
+    item id, unit price in sen, quantity). Item names are interned to
+    integer ids in first-purchase order. A second set of per-purchase
+    columns records where each purchase's lines start, its timestamp, its
+    local calendar day and its exact total in sen. Arrays grow by doubling, and lines()/purchases()
+    return DataFrames that are views over the filled part (no copy).
+    """
+    
+    LINE_COLUMNS = {
+        'purchase_id': np.int32,
+        'timestamp': np.int64,
+        'item_id': np.int32,
+        'price_sen': np.int64,
+        'quantity': np.int32,
     }
+    PURCHASE_COLUMNS = {
+        'first_line': np.int64,
+        'timestamp': np.int64,
+        'day': np.int32,
+        'total_sen': np.int64,
+    }
+    
+    def __init__(self):
+        self.clear()
+    
+    def clear(self):
+        """Drop every purchase"""
+        self.item_names = []
+        self.item_ids = {}
+        self.line_count = 0
+        self.purchase_count = 0
+        self.line_columns = {name: np.empty(PURCHASE_LOG_CHUNK, dtype) for name, dtype in self.LINE_COLUMNS.items()}
+        self.purchase_columns = {name: np.empty(PURCHASE_LOG_CHUNK, dtype) for name, dtype in self.PURCHASE_COLUMNS.items()}
+    
+    def __len__(self):
+        return self.purchase_count
+    
+    @staticmethod
+    def reserve(columns, needed):
+        """Grow columns so they can hold at least `needed` rows"""
+        capacity = len(next(iter(columns.values())))
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name, column in columns.items():
+            grown = np.empty(capacity, column.dtype)
+            grown[:len(column)] = column
+            columns[name] = grown
+    
+    def item_id(self, item):
+        """Integer id for an item name, assigned on first purchase"""
+        item_id = self.item_ids.get(item)
+        if item_id is None:
+            item_id = self.item_ids[item] = len(self.item_names)
+            self.item_names.append(item)
+        return item_id
+    
+    def append(self, when, lines):
+        """Record one purchase of (item, unit price in sen, quantity) lines made at datetime `when`"""
+        lines = list(lines)
+        purchase_id = self.purchase_count
+        timestamp = int(when.timestamp())
+        start, stop = self.line_count, self.line_count + len(lines)
+        
+        self.reserve(self.purchase_columns, purchase_id + 1)
+        self.reserve(self.line_columns, stop)
+        
+        columns = self.line_columns
+        columns['purchase_id'][start:stop] = purchase_id
+        columns['timestamp'][start:stop] = timestamp
+        columns['item_id'][start:stop] = [self.item_id(item) for item, price, quantity in lines]
+        columns['price_sen'][start:stop] = [price_sen for item, price_sen, quantity in lines]
+        columns['quantity'][start:stop] = [quantity for item, price, quantity in lines]
+        total_sen = int(columns['price_sen'][start:stop] @ columns['quantity'][start:stop].astype(np.int64))
+        
+        columns = self.purchase_columns
+        columns['first_line'][purchase_id] = start
+        columns['timestamp'][purchase_id] = timestamp
+        columns['day'][purchase_id] = when.toordinal()
+        columns['total_sen'][purchase_id] = total_sen
+        
+        self.line_count = stop
+        self.purchase_count = purchase_id + 1
+        return purchase_id
+    
+    def lines(self):
+        """All purchase lines as a DataFrame sharing memory with the log"""
+        count = self.line_count
+        return pd.DataFrame({name: column[:count] for name, column in self.line_columns.items()}, copy=False)
+    
+    def purchases(self):
+        """One row per purchase (first line, timestamp, day ordinal, total in sen) sharing memory with the log"""
+        count = self.purchase_count
+        return pd.DataFrame({name: column[:count] for name, column in self.purchase_columns.items()}, copy=False)
+    
+    def line_range(self, purchase_id):
+        """Slice of line rows belonging to one purchase"""
+        start = self.purchase_columns['first_line'][purchase_id]
+        if purchase_id + 1 < self.purchase_count:
+            stop = self.purchase_columns['first_line'][purchase_id + 1]
+        else:
+            stop = self.line_count
+        return slice(int(start), int(stop))
+    
+    def purchase(self, purchase_id):
+        """One purchase in the {'date', 'items', 'total_sen'} form the UI shows (amounts in sen)"""
+        rows = self.line_range(purchase_id)
+        columns = self.line_columns
+        items = {
+            self.item_names[item_id]: {'price_sen': price_sen, 'quantity': quantity}
+            for item_id, price_sen, quantity in zip(columns['item_id'][rows].tolist(), columns['price_sen'][rows].tolist(), columns['quantity'][rows].tolist())
+        }
+        return {
+            'date': datetime.fromtimestamp(int(self.purchase_columns['timestamp'][purchase_id])).strftime('%Y-%m-%d %H:%M:%S'),
+            'items': items,
+            'total_sen': int(self.purchase_columns['total_sen'][purchase_id])
+        }
+    
+    def total_spent_sen(self):
+        """Exact total of every purchase, in sen"""
+        return int(self.purchase_columns['total_sen'][:self.purchase_count].sum())
 
 def save_purchase_to_history():
     """Save current cart to purchase history"""
     if st.session_state.shopping_cart:
-        purchase = {
-            'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'items': dict(st.session_state.shopping_cart),
-            'total': sum(details['price'] * details['quantity'] for details in st.session_state.shopping_cart.values())
-        }
-        st.session_state.purchase_history.append(purchase)
+        # Empty the cart in one step, so a household member's add is not lost in between
+        cart = st.session_state.shopping_cart.take_if_unchanged()
+        st.session_state.purchase_history.append(datetime.now(), cart.export_lines())
+        st.session_state.history_version += 1
         
         # Update category statistics
-        update_category_stats()
+        update_category_stats(cart)
+
+def new_category_tally():
+    """Empty running category totals"""
+    return {
+        'items': {},    # item -> [category it is counted under, amount spent]
+        'members': {},  # category -> number of purchased items counted under it
+        'catalog_version': None,
+    }
+
+def add_to_category_tally(tally, stats, category, item, amount):
+    """Count an amount spent on an item under its category, in a tally and
+    the {category: amount} statistics kept beside it"""
+    entry = tally['items'].get(item)
+    if entry is None:
+        entry = tally['items'][item] = [category, 0]
+        tally['members'][category] = tally['members'].get(category, 0) + 1
+        stats.setdefault(category, 0)
+    entry[1] += amount
+    stats[entry[0]] += amount
+
+def sync_category_stats():
+    """Move totals for purchased items whose category changed since the last sync"""
+    tally = st.session_state.category_tally
+    version = get_catalog_store().version()
+    if tally['catalog_version'] == version:
+        return False
+    tally['catalog_version'] = version
+    
+    stats = st.session_state.category_stats
+    members = tally['members']
+    items = tally['items']
+    changed = False
+    for item, category in zip(list(items), get_item_categories(list(items))):
+        entry = items[item]
+        old_category, amount = entry
+        if category == old_category:
+            continue
+        
+        # Take the item's total out of its old category...
+        stats[old_category] -= amount
+        members[old_category] -= 1
+        if not members[old_category]:
+            del members[old_category]
+            del stats[old_category]
         
-        # Clear cart
-        st.session_state.shopping_cart.clear()
+        # ...and put it under the new one
+        entry[0] = category
+        members[category] = members.get(category, 0) + 1
+        stats[category] = stats.get(category, 0) + amount
+        changed = True
+    return changed
+
+def update_category_stats(cart):
+    """Add one purchase's cart lines to the running category statistics"""
+    sync_category_stats()
+    tally = st.session_state.category_tally
+    stats = st.session_state.category_stats
+    for (item, line), category in zip(cart.items(), get_item_categories(list(cart))):
+        add_to_category_tally(tally, stats, category, item, line.subtotal_sen)
 
-def update_category_stats():
-    """Update category statistics based on purchase history"""
+def recompute_category_stats():
+    """Category statistics computed from scratch over the whole purchase history"""
+    log = st.session_state.purchase_history
+    lines = log.lines()
+    spent = np.zeros(len(log.item_names), dtype=np.int64)
+    np.add.at(spent, lines['item_id'].to_numpy(), lines['price_sen'].to_numpy() * lines['quantity'].to_numpy())
+    
     category_totals = {}
+    for amount, category in zip(spent.tolist(), get_item_categories(log.item_names)):
+        if category not in category_totals:
+            category_totals[category] = 0
+        category_totals[category] += amount
     
-    for purchase in st.session_state.purchase_history:
-        for item, details in purchase['items'].items():
-            category = get_item_category(item)
-            if category not in category_totals:
-                category_totals[category] = 0
-            category_totals[category] += details['price'] * details['quantity']
+    return category_totals
+
+def verify_category_stats():
+    """Compare the running category totals with a full recompute, returning any mismatches"""
+    sync_category_stats()
+    expected = recompute_category_stats()
+    actual = st.session_state.category_stats
+    mismatches = {}
+    for category in expected.keys() | actual.keys():
+        if expected.get(category) != actual.get(category):
+            mismatches[category] = (actual.get(category), expected.get(category))
+    return mismatches
+
+def reset_category_stats():
+    """Forget all category statistics (e.g. when history is cleared)"""
+    st.session_state.category_stats = {}
+    st.session_state.category_tally = new_category_tally()
+
+# The one list of categories every tab offers
+CATEGORIES = list(CATEGORY_KEYWORDS.keys())
+
+CATALOG_DB_PATH = default_catalog_db_path()
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    name TEXT PRIMARY KEY,
+    price REAL NOT NULL,
+    category TEXT NOT NULL,
+    manual_category INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_items_category ON items (category, name);
+CREATE INDEX IF NOT EXISTS idx_items_name_nocase ON items (name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS catalog_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO catalog_meta (key, value) VALUES ('version', 0);
+
+-- Append-only price history. Item ids follow an item through renames and
+-- are never reused: when an item is deleted or renamed away its name is
+-- released (set to NULL), so an item later given that name gets a new id
+-- and an empty history. Rows are never deleted, so ids only grow. The
+-- triggers below record every price an item is given, whichever write
+-- path sets it.
+CREATE TABLE IF NOT EXISTS item_ids (
+    item_id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE
+);
+CREATE TABLE IF NOT EXISTS price_history (
+    item_id INTEGER NOT NULL,
+    changed_at INTEGER NOT NULL,
+    price_sen INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_price_history_item ON price_history (item_id, changed_at);
+
+-- Catalogs created before price history start from their current prices
+INSERT OR IGNORE INTO item_ids (name) SELECT name FROM items;
+INSERT INTO price_history (item_id, changed_at, price_sen)
+    SELECT item_ids.item_id, CAST(strftime('%s', 'now') AS INTEGER), CAST(ROUND(items.price * 100) AS INTEGER)
+    FROM items JOIN item_ids ON item_ids.name = items.name
+    WHERE NOT EXISTS (SELECT 1 FROM price_history WHERE price_history.item_id = item_ids.item_id);
+
+CREATE TRIGGER IF NOT EXISTS record_new_item_price AFTER INSERT ON items
+BEGIN
+    UPDATE item_ids SET name = NULL WHERE name = NEW.name;
+    INSERT INTO item_ids (name) VALUES (NEW.name);
+    INSERT INTO price_history (item_id, changed_at, price_sen)
+        SELECT item_id, CAST(strftime('%s', 'now') AS INTEGER), CAST(ROUND(NEW.price * 100) AS INTEGER)
+        FROM item_ids WHERE name = NEW.name;
+END;
+
+CREATE TRIGGER IF NOT EXISTS record_item_price_change AFTER UPDATE OF name, price ON items
+BEGIN
+    UPDATE item_ids SET name = NULL WHERE name = NEW.name AND NEW.name != OLD.name;
+    UPDATE item_ids SET name = NEW.name WHERE name = OLD.name AND NEW.name != OLD.name;
+    INSERT INTO price_history (item_id, changed_at, price_sen)
+        SELECT item_id, CAST(strftime('%s', 'now') AS INTEGER), CAST(ROUND(NEW.price * 100) AS INTEGER)
+        FROM item_ids WHERE name = NEW.name AND ROUND(NEW.price * 100) != ROUND(OLD.price * 100);
+END;
+
+CREATE TRIGGER IF NOT EXISTS release_deleted_item_id AFTER DELETE ON items
+BEGIN
+    UPDATE item_ids SET name = NULL WHERE name = OLD.name;
+END;
+"""
+
+# Upsert that keeps a manually chosen category unless the new row brings its own
+UPSERT_ITEM_SQL = """
+INSERT INTO items (name, price, category, manual_category) VALUES (?, ?, ?, ?)
+ON CONFLICT (name) DO UPDATE SET
+    price = excluded.price,
+    category = CASE WHEN excluded.manual_category OR NOT items.manual_category
+                    THEN excluded.category ELSE items.category END,
+    manual_category = MAX(items.manual_category, excluded.manual_category)
+"""
+
+# SQLite limits how many ? parameters one statement may have
+SQL_BATCH_SIZE = 500
+
+# Most catalog connections open at once; reruns beyond this wait for one
+CATALOG_POOL_SIZE = 4
+
+SEARCH_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+# Scores for how a query word matched a word in an item name
+EXACT_MATCH_SCORE = 3.0
+PREFIX_MATCH_SCORE = 2.0
+INFIX_MATCH_SCORE = 1.5
+FUZZY_MATCH_THRESHOLD = 0.35
+
+# Most results the search boxes show at once
+SEARCH_RESULT_LIMIT = 50
+
+def tokenize(text):
+    """Split text into lowercase search words"""
+    return SEARCH_TOKEN_PATTERN.findall(text.lower())
+
+def trigrams(word):
+    """Padded three-letter chunks of a word, used for typo-tolerant matching"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SearchIndex:
+    """Word, prefix and trigram index over catalog item names.
+
+    Words map to the items that contain them, a sorted vocabulary answers
+    prefix queries, and trigrams map to words so misspelt query words can
+    still find close matches (only for query words that are not in the
+    vocabulary themselves). Items must match every query word; results
+    are ranked by how well they matched, then by name.
+    
+    One-letter query words match as word prefixes only; two-letter ones,
+    whose trigrams only cover the word ends, find infixes by a scan of the
+    vocabulary.
+    """
+    
+    def __init__(self, names=()):
+        self.names = {}
+        self.ids = {}
+        self.next_id = 0
+        self.word_items = {}
+        self.trigram_words = {}
+        self.vocabulary_text = None
+        self.infix_cache = {}
+        self.allowed_ids = None
+        for name in names:
+            self.add_name(name, keep_sorted=False)
+        self.vocabulary = sorted(self.word_items)
+        self.sorted_ids = sorted(self.names, key=self.names.__getitem__)
+    
+    def add_name(self, name, keep_sorted=True):
+        if name in self.ids:
+            return
+        item_id = self.next_id
+        self.next_id += 1
+        self.names[item_id] = name
+        self.ids[name] = item_id
+        self.allowed_ids = None
+        if keep_sorted:
+            bisect.insort(self.sorted_ids, item_id, key=self.names.__getitem__)
+        
+        for word in set(tokenize(name)):
+            if word not in self.word_items:
+                self.word_items[word] = set()
+                for gram in trigrams(word):
+                    self.trigram_words.setdefault(gram, set()).add(word)
+                if keep_sorted:
+                    bisect.insort(self.vocabulary, word)
+                self.vocabulary_text = None
+            self.word_items[word].add(item_id)
+    
+    def remove_name(self, name):
+        item_id = self.ids.pop(name, None)
+        if item_id is None:
+            return
+        del self.sorted_ids[bisect.bisect_left(self.sorted_ids, name, key=self.names.__getitem__)]
+        del self.names[item_id]
+        self.allowed_ids = None
+        
+        for word in set(tokenize(name)):
+            items = self.word_items[word]
+            items.discard(item_id)
+            if not items:
+                # Last item using this word, so forget the word entirely
+                del self.word_items[word]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, word)]
+                for gram in trigrams(word):
+                    self.trigram_words[gram].discard(word)
+                self.vocabulary_text = None
+    
+    def infix_words(self, fragment):
+        """Vocabulary words containing a short fragment, found with one regex scan"""
+        if self.vocabulary_text is None:
+            self.vocabulary_text = '\n'.join(self.vocabulary)
+            self.infix_cache = {}
+        words = self.infix_cache.get(fragment)
+        if words is None:
+            words = self.infix_cache[fragment] = re.findall(
+                f'^.*{re.escape(fragment)}.*$', self.vocabulary_text, re.MULTILINE
+            )
+        return words
+    
+    def word_matches(self, query_word):
+        """Vocabulary words matching one query word, each with a score"""
+        matches = {}
+        
+        # Prefix matches (an exact match is the shortest prefix match)
+        position = bisect.bisect_left(self.vocabulary, query_word)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(query_word):
+            word = self.vocabulary[position]
+            matches[word] = EXACT_MATCH_SCORE if word == query_word else PREFIX_MATCH_SCORE
+            position += 1
+        
+        if len(query_word) == 1:
+            return matches
+        if len(query_word) == 2:
+            for word in self.infix_words(query_word):
+                matches.setdefault(word, INFIX_MATCH_SCORE)
+            return matches
+        
+        # Words containing the query word have every one of its inner trigrams
+        no_words = frozenset()
+        inner_words = [
+            self.trigram_words.get(query_word[i:i + 3], no_words) for i in range(len(query_word) - 2)
+        ]
+        for word in min(inner_words, key=len).intersection(*inner_words):
+            if word not in matches and query_word in word:
+                matches[word] = INFIX_MATCH_SCORE
+        
+        # A word that is in the vocabulary is not a typo, so only look for
+        # near misses otherwise. They share enough trigrams for the similarity
+        # threshold even at the shortest word length; count shared trigrams in C
+        if query_word in self.word_items:
+            return matches
+        query_grams = trigrams(query_word)
+        shared_counts = Counter(chain.from_iterable(self.trigram_words.get(gram, ()) for gram in query_grams))
+        min_shared = FUZZY_MATCH_THRESHOLD * (len(query_grams) + 2) / (1 + FUZZY_MATCH_THRESHOLD)
+        for word, shared in shared_counts.items():
+            if shared < min_shared or word in matches:
+                continue
+            similarity = shared / (len(query_grams) + len(word) + 1 - shared)
+            if similarity >= FUZZY_MATCH_THRESHOLD:
+                matches[word] = similarity
+        
+        return matches
     
-    st.session_state.category_stats = category_totals
+    def score_tiers(self, query_word):
+        """[(score, item ids)] for one query word, best score first; each item
+        is only in its best tier. The sets may be the index's own, so callers
+        must not change them."""
+        by_score = {}
+        for word, score in self.word_matches(query_word).items():
+            by_score.setdefault(score, []).append(self.word_items[word])
+        
+        tiers = []
+        seen = set()
+        for score in sorted(by_score, reverse=True):
+            postings = by_score[score]
+            items = postings[0] if len(postings) == 1 else set().union(*postings)
+            if seen:
+                items = items - seen
+            if items:
+                tiers.append((score, items))
+                seen = seen | items if len(tiers) < len(by_score) else seen
+        return tiers
+    
+    def ids_of(self, allowed):
+        """Item ids of a set of allowed names, remembered while the index is unchanged"""
+        if self.allowed_ids is None or self.allowed_ids[0] is not allowed:
+            ids = self.ids
+            self.allowed_ids = (allowed, {ids[name] for name in allowed if name in ids})
+        return self.allowed_ids[1]
+    
+    def first_by_name(self, item_ids, count):
+        """Up to `count` of the given ids in name order"""
+        if count * len(self.sorted_ids) < 4 * len(item_ids) * len(item_ids):
+            # Plenty of hits: walking the name-ordered ids meets `count` of them quickly
+            found = []
+            for item_id in self.sorted_ids:
+                if item_id in item_ids:
+                    found.append(item_id)
+                    if len(found) == count:
+                        break
+            return found
+        return sorted(item_ids, key=self.names.__getitem__)[:count]
+    
+    def search(self, query, allowed=None, limit=None):
+        """Return (number of matches, best matching names) for a query.
+
+        The query word with the fewest matching items gives the starting
+        candidates and every other word is intersected into them, all as
+        set operations. Names are then taken best total score first (score
+        tiers combined best-first), alphabetically within a score, and the
+        search stops once `limit` names are found.
+        """
+        word_tiers = []
+        for query_word in tokenize(query):
+            tiers = self.score_tiers(query_word)
+            if not tiers:
+                return 0, []
+            word_tiers.append(tiers)
+        if not word_tiers:
+            return 0, []
+        word_tiers.sort(key=lambda tiers: sum(len(items) for score, items in tiers))
+        
+        first_tiers = [items for score, items in word_tiers[0]]
+        candidates = first_tiers[0] if len(first_tiers) == 1 else set().union(*first_tiers)
+        narrowed = allowed is not None or len(word_tiers) > 1
+        if allowed is not None:
+            candidates = candidates & self.ids_of(allowed)
+        for tiers in word_tiers[1:]:
+            matched = set()
+            for score, items in tiers:
+                matched |= candidates & items
+            candidates = matched
+            if not candidates:
+                return 0, []
+        
+        match_count = len(candidates)
+        if limit is None:
+            limit = match_count
+        
+        # Each word's tiers cut down to the candidates
+        if narrowed:
+            word_tiers = [
+                [(score, candidates & items) for score, items in tiers] for tiers in word_tiers
+            ]
+            word_tiers = [[(score, items) for score, items in tiers if items] for tiers in word_tiers]
+        
+        # Walk combinations of tiers (one per query word) best total first;
+        # combinations with the same total are merged so ties stay alphabetical
+        start = (0,) * len(word_tiers)
+        total = lambda combination: sum(tiers[index][0] for tiers, index in zip(word_tiers, combination))
+        heap = [(-total(start), start)]
+        queued = {start}
+        best = []
+        while heap and len(best) < limit:
+            score, combination = heapq.heappop(heap)
+            same_score = [combination]
+            while heap and heap[0][0] == score:
+                same_score.append(heapq.heappop(heap)[1])
+            
+            hit_sets = []
+            for combination in same_score:
+                sets = sorted((tiers[index][1] for tiers, index in zip(word_tiers, combination)), key=len)
+                hit_sets.append(sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0])
+                for position, tiers in enumerate(word_tiers):
+                    if combination[position] + 1 < len(tiers):
+                        following = combination[:position] + (combination[position] + 1,) + combination[position + 1:]
+                        if following not in queued:
+                            queued.add(following)
+                            heapq.heappush(heap, (-total(following), following))
+            hits = hit_sets[0] if len(hit_sets) == 1 else set().union(*hit_sets)
+            if hits:
+                best.extend(self.first_by_name(hits, limit - len(best)))
+        
+        return match_count, [self.names[item_id] for item_id in best]
+
+class PriceHistory:
+    """In-memory index over the catalog's price_history table.
+
+    Price points are kept sorted by (item id, time) as two compact columns:
+    an int64 key (item id << 32 | epoch second) and an int32 price in sen.
+    offsets[item_id] is where an item's points start, so one item's series
+    is a slice, and "price of these items at these times" for any number of
+    items is one np.searchsorted over the keys. New rows are merged in by
+    table rowid, so refreshing after a write only reads what was added.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_rowid = 0
+        self.index = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32), np.zeros(1, dtype=np.int64))
+    
+    def __len__(self):
+        return len(self.index[0])
+    
+    def refresh(self, conn):
+        """Merge in any price points written since the last refresh"""
+        with self.lock:
+            last_rowid = conn.execute('SELECT MAX(rowid) FROM price_history').fetchone()[0] or 0
+            if last_rowid <= self.last_rowid:
+                return
+            # Two integers per row, read straight into one flat array
+            flat = np.fromiter(chain.from_iterable(conn.execute(
+                'SELECT (item_id << 32) | changed_at, price_sen FROM price_history WHERE rowid > ? AND rowid <= ?',
+                (self.last_rowid, last_rowid)
+            )), dtype=np.int64)
+            self.last_rowid = last_rowid
+            new_keys = flat[0::2]
+            order = np.argsort(new_keys, kind='stable')
+            new_keys = new_keys[order]
+            new_prices = flat[1::2][order].astype(np.int32)
+            
+            # side='right' keeps points from the same second in write order
+            keys, prices_sen, offsets = self.index
+            positions = np.searchsorted(keys, new_keys, side='right')
+            keys = np.insert(keys, positions, new_keys)
+            prices_sen = np.insert(prices_sen, positions, new_prices)
+            item_count = int(keys[-1] >> 32) + 1
+            offsets = np.searchsorted(keys, np.arange(item_count + 1, dtype=np.int64) << 32)
+            # Replaced in one assignment so readers never mix old and new arrays
+            self.index = (keys, prices_sen, offsets)
+    
+    def columns(self):
+        """(keys, prices in sen, offsets) as of the last refresh"""
+        return self.index
+    
+    def series(self, item_id):
+        """(epoch seconds, prices in sen) of one item, oldest first"""
+        keys, prices_sen, offsets = self.columns()
+        if item_id >= len(offsets) - 1:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+        points = slice(offsets[item_id], offsets[item_id + 1])
+        return keys[points] & 0xFFFFFFFF, prices_sen[points]
+    
+    def changed_items(self):
+        """Ids of items that have had more than one price"""
+        keys, prices_sen, offsets = self.columns()
+        return np.flatnonzero(np.diff(offsets) > 1)
+    
+    def as_of(self, item_ids, timestamps):
+        """Price in sen of each item at each epoch timestamp (broadcast together).
+
+        Times before an item's first price get that first price. Every item
+        asked about must have at least one price point.
+        """
+        keys, prices_sen, offsets = self.columns()
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        positions = np.searchsorted(keys, (item_ids << 32) | timestamps, side='right') - 1
+        return prices_sen[np.maximum(positions, offsets[item_ids])]
+    
+    def latest(self, item_ids):
+        """Current price in sen of each item"""
+        keys, prices_sen, offsets = self.columns()
+        return prices_sen[offsets[np.asarray(item_ids, dtype=np.int64) + 1] - 1]
+    
+    def movers(self, since, threshold):
+        """(item ids, price then, price now, relative change) for items whose
+        price moved by more than `threshold` (0.1 = 10%) since epoch `since`.
+        Items first priced after `since`, or priced at zero then, have no
+        base price and are left out."""
+        keys, prices_sen, offsets = self.columns()
+        item_ids = self.changed_items()
+        first_priced = keys[offsets[item_ids]] & 0xFFFFFFFF
+        then = self.as_of(item_ids, since).astype(np.float64)
+        now = self.latest(item_ids).astype(np.float64)
+        has_base = (first_priced <= since) & (then > 0)
+        change = np.divide(now - then, then, out=np.zeros_like(then), where=has_base)
+        moved = has_base & (np.abs(change) > threshold)
+        return item_ids[moved], then[moved].astype(np.int64), now[moved].astype(np.int64), change[moved]
+    
+    def category_indices(self, item_ids, category_codes, category_sizes, timestamps):
+        """Price index per category at each timestamp (100 = prices at timestamps[0]).
+
+        An index is the geometric mean of every member's price relative to
+        its price at the first timestamp. item_ids/category_codes list the
+        changed items and their category positions; category_sizes counts
+        all members, since unchanged items contribute a ratio of 1, and so
+        does any item with a zero price in the window (no usable ratio).
+        """
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        prices = self.as_of(item_ids[:, None], timestamps[None, :]).astype(np.float64)
+        priced = (prices > 0).all(axis=1)
+        log_ratios = np.zeros_like(prices)
+        log_ratios[priced] = np.log(prices[priced] / prices[priced, :1])
+        sums = np.zeros((len(category_sizes), len(timestamps)))
+        np.add.at(sums, np.asarray(category_codes, dtype=np.int64), log_ratios)
+        sizes = np.maximum(np.asarray(category_sizes, dtype=np.float64), 1)
+        return 100 * np.exp(sums / sizes[:, None])
+
+class CatalogStore(Mapping):
+    """Grocery catalog shared by every session, kept in SQLite (WAL mode)
+    and read through a small pool of connections.
+
+    Reads behave like a read-only {name: price} dict. Every write goes
+    through a method here so the stored category and the version counter
+    stay in step. Listings are cached per version, so a rerun that has
+    not changed the catalog does no query or classification work.
+    """
+    
+    def __init__(self, path, pool_size=CATALOG_POOL_SIZE):
+        self.path = path
+        self.pool_slots = threading.BoundedSemaphore(pool_size)
+        self.pool_lock = threading.Lock()
+        self.idle_connections = []
+        self.local = threading.local()
+        self.cache_lock = threading.Lock()
+        self.listing_cache = {}
+        self.listing_version = None
+        self.search_lock = threading.Lock()
+        self.search_index = None
+        self.search_version = None
+        self.history = PriceHistory()
+        self.history_version = None
+        
+        with self.connection() as conn:
+            conn.executescript(CATALOG_SCHEMA)
+        if len(self) == 0:
+            self.upsert_items((name, price, None) for name, price in DEFAULT_GROCERY_ITEMS.items())
+    
+    def borrow_connection(self):
+        """Take an idle pooled connection, opening one if the pool is not full yet.
+        Waits while pool_size connections are in use."""
+        self.pool_slots.acquire()
+        with self.pool_lock:
+            if self.idle_connections:
+                return self.idle_connections.pop()
+        try:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+        except BaseException:
+            self.pool_slots.release()
+            raise
+        return conn
+    
+    def return_connection(self, conn):
+        with self.pool_lock:
+            self.idle_connections.append(conn)
+        self.pool_slots.release()
+    
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection for a with block.
+
+        Streamlit runs every rerun on a fresh thread, so connections are
+        pooled instead of kept per thread. A thread that already holds one
+        (e.g. inside transaction()) keeps using it.
+        """
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self.borrow_connection()
+        self.local.conn = conn
+        try:
+            yield conn
+        finally:
+            self.local.conn = None
+            self.return_connection(conn)
+    
+    @contextmanager
+    def transaction(self, added=(), removed=()):
+        """Run a write transaction and bump the catalog version when it commits.
+
+        added/removed are the item names the write creates or deletes, so the
+        search index can be patched instead of rebuilt.
+        """
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                version = conn.execute("SELECT value FROM catalog_meta WHERE key = 'version'").fetchone()[0]
+                yield conn
+                conn.execute("UPDATE catalog_meta SET value = value + 1 WHERE key = 'version'")
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        
+        with self.search_lock:
+            # Only patch an index that was up to date before this write;
+            # otherwise it is rebuilt on the next search
+            if self.search_index is not None and self.search_version == version:
+                for name in removed:
+                    self.search_index.remove_name(name)
+                for name in added:
+                    self.search_index.add_name(name)
+                self.search_version = version + 1
+    
+    def version(self):
+        """Current catalog version, bumped by every write from any session"""
+        with self.connection() as conn:
+            return conn.execute("SELECT value FROM catalog_meta WHERE key = 'version'").fetchone()[0]
+    
+    # Read-only dict interface: catalog[name] -> price
+    def __getitem__(self, name):
+        with self.connection() as conn:
+            row = conn.execute('SELECT price FROM items WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row[0]
+    
+    def __contains__(self, name):
+        with self.connection() as conn:
+            return conn.execute('SELECT 1 FROM items WHERE name = ?', (name,)).fetchone() is not None
+    
+    def __iter__(self):
+        return (name for name, price in self.listing())
+    
+    def __len__(self):
+        with self.connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+    
+    def listing(self, category=None):
+        """Sorted (name, price) rows for one category, or the whole catalog"""
+        version = self.version()
+        with self.cache_lock:
+            if self.listing_version != version:
+                self.listing_cache = {}
+                self.listing_version = version
+            rows = self.listing_cache.get(category)
+        
+        if rows is None:
+            with self.connection() as conn:
+                if category is None:
+                    rows = conn.execute('SELECT name, price FROM items ORDER BY name').fetchall()
+                else:
+                    rows = conn.execute(
+                        'SELECT name, price FROM items WHERE category = ? ORDER BY name', (category,)
+                    ).fetchall()
+            with self.cache_lock:
+                if self.listing_version == version:
+                    self.listing_cache[category] = rows
+        
+        return rows
+    
+    def names_in(self, category):
+        """Set of item names in a category, cached like listing()"""
+        key = ('names', category)
+        with self.cache_lock:
+            names = self.listing_cache.get(key) if self.listing_version == self.version() else None
+        if names is None:
+            names = frozenset(name for name, price in self.listing(category))
+            with self.cache_lock:
+                self.listing_cache[key] = names
+        return names
+    
+    def prices_of(self, names):
+        """Prices for the given names (names not in the catalog are left out)"""
+        names = list(names)
+        found = {}
+        with self.connection() as conn:
+            for start in range(0, len(names), SQL_BATCH_SIZE):
+                batch = names[start:start + SQL_BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                found.update(conn.execute(
+                    f'SELECT name, price FROM items WHERE name IN ({placeholders})', batch
+                ))
+        return found
+    
+    def export_batches(self):
+        """Column batches of the whole catalog, read on one pooled connection
+        that is held until the last batch (or until the generator is closed)"""
+        conn = self.borrow_connection()
+        try:
+            yield from catalog_batches(conn)
+        finally:
+            self.return_connection(conn)
+    
+    def search(self, query, category=None, limit=SEARCH_RESULT_LIMIT):
+        """Ranked search over item names: (number of matches, [(name, price), ...])"""
+        version = self.version()
+        with self.search_lock:
+            if self.search_index is None or self.search_version != version:
+                self.search_index = SearchIndex(name for name, price in self.listing())
+                self.search_version = version
+            allowed = self.names_in(category) if category else None
+            match_count, names = self.search_index.search(query, allowed, limit)
+        
+        prices = self.prices_of(names)
+        return match_count, [(name, prices[name]) for name in names if name in prices]
+    
+    def categories_of(self, names):
+        """Stored categories for the given names (names not in the catalog are left out)"""
+        names = list(names)
+        found = {}
+        with self.connection() as conn:
+            for start in range(0, len(names), SQL_BATCH_SIZE):
+                batch = names[start:start + SQL_BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                found.update(conn.execute(
+                    f'SELECT name, category FROM items WHERE name IN ({placeholders})', batch
+                ))
+        return found
+    
+    def price_history(self):
+        """The price history index, brought up to the current catalog version"""
+        version = self.version()
+        if self.history_version != version:
+            with self.connection() as conn:
+                self.history.refresh(conn)
+            self.history_version = version
+        return self.history
+    
+    def item_ids_of(self, names):
+        """Price history item ids for the given names (unknown names are left out)"""
+        names = list(names)
+        found = {}
+        with self.connection() as conn:
+            for start in range(0, len(names), SQL_BATCH_SIZE):
+                batch = names[start:start + SQL_BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                found.update(conn.execute(
+                    f'SELECT name, item_id FROM item_ids WHERE name IN ({placeholders})', batch
+                ))
+        return found
+    
+    def current_items(self, item_ids):
+        """{item id: (name, category)} for ids of items still in the catalog"""
+        item_ids = [int(item_id) for item_id in item_ids]
+        found = {}
+        with self.connection() as conn:
+            for start in range(0, len(item_ids), SQL_BATCH_SIZE):
+                batch = item_ids[start:start + SQL_BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                found.update(
+                    (item_id, (name, category)) for item_id, name, category in conn.execute(
+                        f"""SELECT item_ids.item_id, items.name, items.category
+                            FROM item_ids JOIN items ON items.name = item_ids.name
+                            WHERE item_ids.item_id IN ({placeholders})""", batch
+                    )
+                )
+        return found
+    
+    def price_series(self, name):
+        """(epoch seconds, prices in sen) of every price an item has had"""
+        item_id = self.item_ids_of([name]).get(name)
+        if item_id is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+        return self.price_history().series(item_id)
+    
+    def price_movers(self, threshold, since):
+        """[(name, category, sen then, sen now, change)] for current items whose
+        price moved by more than `threshold` since epoch `since`, biggest first"""
+        item_ids, then, now, change = self.price_history().movers(since, threshold)
+        current = self.current_items(item_ids)
+        movers = [
+            current[item_id] + (int(price_then), int(price_now), float(item_change))
+            for item_id, price_then, price_now, item_change in zip(item_ids.tolist(), then, now, change)
+            if item_id in current
+        ]
+        movers.sort(key=lambda mover: -abs(mover[4]))
+        return movers
+    
+    def category_price_indices(self, categories, timestamps):
+        """{category: index at each timestamp} (100 = prices at timestamps[0])"""
+        history = self.price_history()
+        with self.connection() as conn:
+            sizes = dict(conn.execute('SELECT category, COUNT(*) FROM items GROUP BY category'))
+        positions = {category: position for position, category in enumerate(categories)}
+        current = self.current_items(history.changed_items())
+        members = [(item_id, positions[category]) for item_id, (name, category) in current.items() if category in positions]
+        indices = history.category_indices(
+            [item_id for item_id, position in members],
+            [position for item_id, position in members],
+            [sizes.get(category, 0) for category in categories],
+            timestamps,
+        )
+        return {category: indices[position] for category, position in positions.items() if sizes.get(category)}
+    
+    def upsert_items(self, rows):
+        """Insert or update many (name, price, category) rows in one transaction.
+
+        A category of None means "work it out from the name" and leaves any
+        manually chosen category alone.
+        """
+        params = [
+            (name, price, category, 1) if category else (name, price, classify_item_name(name), 0)
+            for name, price, category in rows
+        ]
+        with self.transaction(added=[row[0] for row in params]) as conn:
+            conn.executemany(UPSERT_ITEM_SQL, params)
+    
+    def upsert_batches(self, batches):
+        """Upsert batches of (name, price, category) rows, all in one transaction.
+
+        Meant for bulk imports: batches are consumed as they are written, so
+        only one is held at a time, and the search index is rebuilt on the
+        next search instead of being patched name by name.
+        """
+        with self.transaction() as conn:
+            for rows in batches:
+                conn.executemany(UPSERT_ITEM_SQL, [
+                    (name, price, category, 1) if category else (name, price, classify_item_name(name), 0)
+                    for name, price, category in rows
+                ])
+        with self.search_lock:
+            self.search_index = None
+    
+    def set_price(self, name, price):
+        with self.transaction() as conn:
+            conn.execute('UPDATE items SET price = ? WHERE name = ?', (price, name))
+    
+    def set_category(self, names, category):
+        """Manually assign a category to one or more items"""
+        with self.transaction() as conn:
+            conn.executemany(
+                'UPDATE items SET category = ?, manual_category = 1 WHERE name = ?',
+                ((category, name) for name in names)
+            )
+    
+    def clear_category(self, name):
+        """Drop a manual category so the item is classified by its name again"""
+        with self.transaction() as conn:
+            conn.execute(
+                'UPDATE items SET category = ?, manual_category = 0 WHERE name = ?',
+                (classify_item_name(name), name)
+            )
+    
+    def rename(self, old_name, new_name, price):
+        """Rename an item, keeping a manual category but re-guessing a derived one"""
+        with self.transaction(added=[new_name], removed=[old_name]) as conn:
+            conn.execute(
+                """UPDATE items SET name = ?, price = ?,
+                       category = CASE WHEN manual_category THEN category ELSE ? END
+                   WHERE name = ?""",
+                (new_name, price, classify_item_name(new_name), old_name)
+            )
+    
+    def delete(self, names):
+        names = list(names)
+        with self.transaction(removed=names) as conn:
+            conn.executemany('DELETE FROM items WHERE name = ?', ((name,) for name in names))
+    
+    def clear(self):
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM items')
+        with self.search_lock:
+            self.search_index = None
+
+@st.cache_resource
+def get_catalog_store():
+    """Open the shared catalog store once per server process"""
+    return CatalogStore(CATALOG_DB_PATH)
 
 def get_item_category(item_name):
     """Determine which category an item belongs to"""
-    # Check if item has a stored category first
-    if 'item_categories' in st.session_state and item_name in st.session_state.item_categories:
-        return st.session_state.item_categories[item_name]
-    
-    # Otherwise, determine by keywords
-    item_lower = item_name.lower()
-    
-    if any(grain in item_lower for grain in ['rice', 'bread', 'oats', 'flour']):
-        return 'Rice & Grains'
-    elif any(protein in item_lower for protein in ['chicken', 'beef', 'fish', 'eggs', 'tofu']):
-        return 'Proteins'
-    elif any(dairy in item_lower for dairy in ['milk', 'yogurt', 'cheese', 'butter']):
-        return 'Dairy'
-    elif any(veg in item_lower for veg in ['potatoes', 'onions', 'carrots', 'cabbage', 'tomatoes', 'cucumber', 'spinach', 'broccoli']):
-        return 'Vegetables'
-    elif any(fruit in item_lower for fruit in ['banana', 'apple', 'orange', 'watermelon', 'papaya', 'mango']):
-        return 'Fruits'
-    elif any(pantry in item_lower for pantry in ['oil', 'sauce', 'salt', 'sugar', 'garlic', 'ginger']):
-        return 'Pantry'
-    elif any(bev in item_lower for bev in ['coffee', 'tea', 'juice', 'water']):
-        return 'Beverages'
-    elif any(house in item_lower for house in ['dish', 'detergent', 'toilet', 'shampoo']):
-        return 'Household'
-    else:
-        return 'Other'
+    return get_item_categories([item_name])[0]
+
+def get_item_categories(item_names):
+    """Determine the categories of many items with one catalog lookup"""
+    item_names = list(item_names)
+    stored = get_catalog_store().categories_of(item_names)
+    # Items no longer in the catalog (e.g. in old purchases) are classified by name
+    return [stored.get(item_name) or classify_item_name(item_name) for item_name in item_names]
 
 def set_item_category(item_name, category):
     """Manually set an item's category"""
-    if 'item_categories' not in st.session_state:
-        st.session_state.item_categories = {}
-    st.session_state.item_categories[item_name] = category
+    get_catalog_store().set_category([item_name], category)
 
 def remove_item_from_category(item_name):
     """Remove an item's category assignment"""
-    if 'item_categories' in st.session_state and item_name in st.session_state.item_categories:
-        del st.session_state.item_categories[item_name]
+    get_catalog_store().clear_category(item_name)
 
 def get_category_items(category):
     """Get all items in a specific category"""
-    category_items = []
-    for item in st.session_state.grocery_items.keys():
-        if get_item_category(item) == category:
-            category_items.append(item)
-    return sorted(category_items)
+    return [name for name, price in get_catalog_store().listing(category)]
 
 def move_item_to_category(item_name, new_category):
     """Move an item to a different category"""
     set_item_category(item_name, new_category)
 
-def export_shopping_list(total):
-    """Export shopping list to HTML format (can be saved as PDF)"""
-    # Create HTML content
-    html_content = f"""
+def move_items_to_category(item_names, new_category):
+    """Move several items to a category in one write"""
+    get_catalog_store().set_category(item_names, new_category)
+
+def add_grocery_item(item_name, price, category=None):
+    """Add a new item to the catalog, optionally with an explicit category"""
+    get_catalog_store().upsert_items([(item_name, price, category)])
+
+def set_item_price(item_name, price):
+    """Change the price of an existing catalog item"""
+    get_catalog_store().set_price(item_name, price)
+
+def import_price_list(price_list, filename):
+    """Stream a CSV or JSON Lines price list into the catalog in one write"""
+    report = ImportReport()
+    batches = iter_price_batches(price_list, import_format_for(filename), CATEGORIES + ['Other'], report)
+    get_catalog_store().upsert_batches(batches)
+    return report
+
+def delete_grocery_items(item_names):
+    """Permanently remove items from the catalog and the cart"""
+    for item in item_names:
+        st.session_state.shopping_cart.remove(item)
+    get_catalog_store().delete(item_names)
+
+def delete_grocery_item(item_name):
+    """Permanently remove one item from the catalog"""
+    delete_grocery_items([item_name])
+
+def rename_grocery_item(old_name, new_name, price):
+    """Rename an item, keeping its category assignment and cart line"""
+    get_catalog_store().rename(old_name, new_name, price)
+    
+    # Update in cart if present
+    st.session_state.shopping_cart.rename(old_name, new_name, price)
+
+# Shopping list export template. The page head (styles) never changes, so
+# it is encoded to bytes once; the rest is written as f-strings below, which
+# Python compiles once instead of parsing a template on every export.
+EXPORT_PAGE_HEAD = """
     <!DOCTYPE html>
     <html>
     <head>
         <meta charset="UTF-8">
         <title>Grocery Shopping List</title>
         <style>
-            body {{
+            body {
                 font-family: Arial, sans-serif;
                 max-width: 800px;
                 margin: 0 auto;
                 padding: 20px;
                 line-height: 1.6;
-            }}
-            .header {{
+            }
+            .header {
                 text-align: center;
                 border-bottom: 2px solid #333;
                 padding-bottom: 20px;
                 margin-bottom: 30px;
-            }}
-            .title {{
+            }
+            .title {
                 font-size: 28px;
                 font-weight: bold;
                 color: #333;
                 margin-bottom: 10px;
-            }}
-            .date {{
+            }
+            .date {
                 font-size: 14px;
                 color: #666;
-            }}
-            .item {{
+            }
+            .item {
                 display: flex;
                 justify-content: space-between;
                 align-items: center;
                 padding: 10px 0;
                 border-bottom: 1px solid #eee;
-            }}
-            .item-info {{
+            }
+            .item-info {
                 flex-grow: 1;
-            }}
-            .item-name {{
+            }
+            .item-name {
                 font-weight: bold;
                 font-size: 16px;
                 margin-bottom: 5px;
-            }}
-            .item-details {{
+            }
+            .item-details {
                 font-size: 14px;
                 color: #666;
-            }}
-            .checkbox {{
+            }
+            .checkbox {
                 font-size: 20px;
                 margin-right: 15px;
-            }}
-            .subtotal {{
+            }
+            .subtotal {
                 font-weight: bold;
                 font-size: 16px;
                 min-width: 100px;
                 text-align: right;
-            }}
-            .total-section {{
+            }
+            .total-section {
                 margin-top: 30px;
                 padding-top: 20px;
                 border-top: 2px solid #333;
                 text-align: right;
-            }}
-            .total {{
+            }
+            .total {
                 font-size: 24px;
                 font-weight: bold;
                 color: #333;
-            }}
-            .footer {{
+            }
+            .footer {
                 text-align: center;
                 margin-top: 40px;
                 padding-top: 20px;
                 border-top: 1px solid #eee;
                 color: #666;
                 font-style: italic;
-            }}
-            @media print {{
-                body {{ margin: 0; }}
-                .no-print {{ display: none; }}
-            }}
+            }
+            @media print {
+                body { margin: 0; }
+                .no-print { display: none; }
+            }
         </style>
     </head>
-    <body>
-        <div class="header">
-            <div class="title">🛒 GROCERY SHOPPING LIST</div>
-            <div class="date">Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}</div>
-        </div>
-        
-        <div class="items-section">
-    """
-    
-    # Add each item
-    for item, details in st.session_state.shopping_cart.items():
-        qty = details['quantity']
-        price = details['price']
-        subtotal = qty * price
-        
-        html_content += f"""
+    <body>""".encode('utf-8')
+
+# Items rendered per yielded chunk, how many rendered lists to keep, and the
+# cart size above which the download is generated on click instead of up front
+EXPORT_CHUNK_ITEMS = 256
+EXPORT_CACHE_ENTRIES = 32
+EXPORT_STREAM_ITEMS = 1000
+
+def render_shopping_list_items(lines):
+    """HTML for a run of (item, unit price in sen, quantity) cart lines"""
+    escape = html.escape
+    return ''.join([f"""
             <div class="item">
                 <div class="checkbox">☐</div>
                 <div class="item-info">
-                    <div class="item-name">{item}</div>
-                    <div class="item-details">Qty: {qty} × RM{price:.2f}</div>
+                    <div class="item-name">{escape(item)}</div>
+                    <div class="item-details">Qty: {qty} × {format_rm(price_sen)}</div>
                 </div>
-                <div class="subtotal">RM{subtotal:.2f}</div>
+                <div class="subtotal">{format_rm(price_sen * qty)}</div>
             </div>
-        """
-    
-    # Add total and footer
-    html_content += f"""
+        """ for item, price_sen, qty in lines])
+
+def iter_shopping_list_html(lines, total_sen, generated):
+    """Yield the shopping list HTML document as UTF-8 chunks"""
+    yield EXPORT_PAGE_HEAD
+    yield f"""
+        <div class="header">
+            <div class="title">🛒 GROCERY SHOPPING LIST</div>
+            <div class="date">Generated: {generated}</div>
+        </div>
+        
+        <div class="items-section">
+    """.encode('utf-8')
+    for start in range(0, len(lines), EXPORT_CHUNK_ITEMS):
+        yield render_shopping_list_items(lines[start:start + EXPORT_CHUNK_ITEMS]).encode('utf-8')
+    yield f"""
         </div>
         
         <div class="total-section">
-            <div class="total">TOTAL: RM{total:.2f}</div>
+            <div class="total">TOTAL: {format_rm(total_sen)}</div>
         </div>
         
         <div class="footer">
@@ -337,56 +1735,647 @@ def export_shopping_list(total):
         </div>
     </body>
     </html>
+    """.encode('utf-8')
+
+class ChunkReader(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks.
+
+    Download buttons read it whole when clicked (Streamlit keeps the bytes
+    in its media store), so this saves building the document up front, not
+    memory at download time. Chunks are consumed by offset, so reading is
+    linear in the document size.
     """
     
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.pending = memoryview(b'')
+        self.offset = 0
+        self.position = 0
+    
+    def readable(self):
+        return True
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        """Only a no-op rewind before reading is supported (download buttons rewind first)"""
+        if offset == 0 and whence == io.SEEK_SET and self.position == 0:
+            return 0
+        raise io.UnsupportedOperation('seek')
+    
+    def readinto(self, buffer):
+        while self.offset == len(self.pending):
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.pending = memoryview(chunk)
+            self.offset = 0
+        size = min(len(buffer), len(self.pending) - self.offset)
+        buffer[:size] = self.pending[self.offset:self.offset + size]
+        self.offset += size
+        self.position += size
+        return size
+    
+    def readall(self):
+        """The rest of the document, joined once"""
+        data = b''.join([self.pending[self.offset:], *self.chunks])
+        self.pending = memoryview(b'')
+        self.offset = 0
+        self.position += len(data)
+        return data
+
+@st.cache_resource(max_entries=EXPORT_CACHE_ENTRIES, show_spinner=False)
+def render_shopping_list(content_hash, generated, _lines, _total_sen):
+    """Rendered shopping list bytes, shared for identical carts in the same minute"""
+    return b''.join(iter_shopping_list_html(_lines, _total_sen, generated))
+
+def purchase_receipt_jobs(history, count):
+    """PDF batch jobs for the first `count` purchases in a PurchaseLog"""
+    for purchase_id in range(count):
+        purchase = history.purchase(purchase_id)
+        lines = tuple((item, details['price_sen'], details['quantity']) for item, details in purchase['items'].items())
+        yield ('receipt', lines, purchase['total_sen'], purchase['date'])
+
+@st.cache_resource
+def get_pdf_pool():
+    """One PDF worker pool for the whole server (workers start on first use)"""
+    return make_pdf_pool()
+
+def build_receipts_zip(history, count, pool):
+    """ZIP archive with one PDF receipt per purchase, rendered on the process pool"""
+    jobs = list(purchase_receipt_jobs(history, count))
+    pdfs = render_pdf_batch(jobs, pool=pool)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for purchase_id, pdf in enumerate(pdfs):
+            archive.writestr(f"receipt_{purchase_id + 1:05d}.pdf", pdf)
+        
+        # List the names the PDF fonts could not draw, so no '?' goes unnoticed
+        notes = [
+            f"receipt_{purchase_id + 1:05d}.pdf: {name}"
+            for purchase_id, (kind, lines, total_sen, when) in enumerate(jobs)
+            for name in unencodable_names(lines)
+        ]
+        if notes:
+            archive.writestr("unprintable_names.txt", "Item names the PDF fonts cannot draw in full (shown with '?'):\n" + "\n".join(notes) + "\n")
+    return buffer.getvalue()
+
+def data_export_button(label, export_format, file_stem, columns, batches):
+    """Download button that builds a CSV / JSONL / Parquet export only when clicked.
+
+    The export is written batch by batch, but Streamlit holds the finished
+    file in memory to serve it.
+    """
+    extension, mime = EXPORT_FORMATS[export_format]
+    st.download_button(
+        label=label,
+        data=lambda: ChunkReader(iter_export(export_format, columns, batches())),
+        file_name=f"{file_stem}_{datetime.now().strftime('%Y%m%d_%H%M')}.{extension}",
+        mime=mime,
+        key=f"export_{file_stem}_{export_format}"
+    )
+
+def export_shopping_list(total_sen):
+    """Export shopping list to HTML format (can be saved as PDF)"""
+    lines = st.session_state.shopping_cart.export_lines()
+    content_hash = st.session_state.shopping_cart.content_hash()
+    generated = datetime.now().strftime('%Y-%m-%d %H:%M')
+    
+    if len(lines) > EXPORT_STREAM_ITEMS:
+        # Big carts are not rendered on every rerun, only when the button is clicked
+        document = None
+        data = lambda: ChunkReader(iter_shopping_list_html(lines, total_sen, generated))
+    else:
+        document = data = render_shopping_list(content_hash, generated, lines, total_sen)
+    
     # Create download button for HTML file
     st.download_button(
         label="📄 Download Shopping List (HTML)",
-        data=html_content,
+        data=data,
         file_name=f"grocery_list_{datetime.now().strftime('%Y%m%d_%H%M')}.html",
         mime="text/html"
     )
     
-    # Display the HTML content in an expandable section
-    with st.expander("📋 Preview Shopping List"):
-        st.components.v1.html(html_content, height=600, scrolling=True)
+    # The PDF is only drawn when its button is clicked
+    unprintable = unencodable_names(lines)
+    if unprintable:
+        st.warning(f"⚠️ The PDF fonts cannot draw every character of {len(unprintable)} item name(s), e.g. "
+                   f"'{unprintable[0]}'; those characters print as '?'. The HTML list shows them correctly.")
+    st.download_button(
+        label="🧾 Download Shopping List (PDF)",
+        data=lambda: render_shopping_list_pdf(lines, total_sen, generated),
+        file_name=f"grocery_list_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf",
+        mime="application/pdf"
+    )
+    
+    export_format = st.selectbox("Cart data format:", list(EXPORT_FORMATS), key="cart_export_format")
+    data_export_button("💾 Download Cart Data", export_format, "grocery_cart", CART_COLUMNS, lambda: cart_batches(lines))
+    
+    # Only embed the document while the preview is switched on
+    if st.toggle("📋 Preview Shopping List", key="export_preview"):
+        if document is None:
+            document = render_shopping_list(content_hash, generated, lines, total_sen)
+        st.components.v1.html(document.decode('utf-8'), height=600, scrolling=True)
         st.info("💡 **Tip**: Download the HTML file and open it in your browser. Then use Ctrl+P (or Cmd+P on Mac) to save it as a PDF!")
 
-# Initialize session state
-if 'grocery_items' not in st.session_state:
-    load_default_items()
+# Page sizes offered for long item lists
+PAGE_SIZE_OPTIONS = [10, 25, 50, 100]
+
+def change_page(key, step):
+    """Button callback that moves a paged list forwards or backwards"""
+    st.session_state[f"{key}_page"] += step
+
+def show_page_controls(total_items, key, filter_token):
+    """Show page navigation for a long list and return the (start, stop) slice to render.
+
+    Only the current page's item widgets are created. Streamlit discards the
+    state of keyed widgets that are not rendered in a run, so the quantity
+    inputs of hidden pages do not pile up in the session.
+    """
+    page_key = f"{key}_page"
+    page_size = st.session_state.get(f"{key}_page_size", PAGE_SIZE_OPTIONS[1])
+    page_count = max(1, -(-total_items // page_size))
+    
+    # Start from the first page whenever the filter or page size changes
+    filter_token = (filter_token, page_size)
+    if st.session_state.get(f"{key}_filter") != filter_token:
+        st.session_state[f"{key}_filter"] = filter_token
+        st.session_state[page_key] = 1
+    st.session_state[page_key] = min(max(st.session_state.get(page_key, 1), 1), page_count)
+    page = st.session_state[page_key]
+    
+    col1, col2, col3, col4 = st.columns([1, 2, 1, 1])
+    with col1:
+        st.button("◀ Prev", key=f"{key}_prev", disabled=page <= 1, on_click=change_page, args=(key, -1))
+    with col2:
+        st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, key=page_key)
+    with col3:
+        st.button("Next ▶", key=f"{key}_next", disabled=page >= page_count, on_click=change_page, args=(key, 1))
+    with col4:
+        st.selectbox("Per page", PAGE_SIZE_OPTIONS, index=1, key=f"{key}_page_size")
+    
+    start = (page - 1) * page_size
+    return start, min(start + page_size, total_items)
+
+def add_to_cart(item, price, quantity):
+    """Add a quantity of an item to the shopping cart"""
+    st.session_state.shopping_cart.add(item, price, quantity)
+
+# Fragment key of the sidebar cart, so item cards can rerun it
+CART_SIDEBAR_KEY = "cart_sidebar"
+
+def add_from_card(item, price, quantity_key, card_keys=()):
+    """Add-button callback: add the quantity chosen in a card, then rerun
+    only the sidebar cart (and the given card fragments), not the app"""
+    quantity = st.session_state[quantity_key]
+    add_to_cart(item, price, quantity)
+    st.session_state.cart_notice = f"Added {quantity}x {item}"
+    st.rerun([CART_SIDEBAR_KEY, *card_keys])
+
+def join_household():
+    """Switch this session between its own cart and a household's shared cart"""
+    code = st.session_state.household_code.strip().lower()
+    if not code:
+        st.session_state.shopping_cart = st.session_state.private_cart
+        st.query_params.pop('household', None)
+        return
+    author = (st.session_state.session_id, st.session_state.household_member.strip() or "Someone")
+    st.session_state.shopping_cart = HouseholdCartView(get_household_carts().join(code), code, author)
+    st.query_params['household'] = code
+
+def show_household_settings():
+    """Sidebar inputs for sharing the cart with a household"""
+    with st.expander("👪 Household Cart", expanded=bool(st.session_state.household_code)):
+        st.text_input("Your name", key="household_member", on_change=join_household)
+        st.text_input("Household code", key="household_code", on_change=join_household,
+                      help="Everyone who enters the same code shares one cart. Leave empty for a private cart.")
+
+# How many of the latest household changes are announced at once
+HOUSEHOLD_TOASTS_SHOWN = 3
+
+def show_household_changes(cart):
+    """Announce what other household members changed since this session last looked"""
+    st.caption(f"👪 Shared with household '{cart.code}'")
+    if st.session_state.pop('cart_conflict', False):
+        st.warning("Someone in your household changed the cart just now. Check it and try again.")
+    
+    changes = cart.poll()
+    if changes is None:
+        st.toast("🛒 Your household updated the cart")
+        return
+    for version, (session_id, who), action, item, quantity in changes[-HOUSEHOLD_TOASTS_SHOWN:]:
+        if action == 'add':
+            st.toast(f"🛒 {who} added {quantity}x {item}")
+        elif action == 'remove':
+            st.toast(f"🛒 {who} removed {item}")
+        elif action == 'clear':
+            st.toast(f"🛒 {who} emptied the cart")
+
+# How often a household cart summary polls for other members' changes
+HOUSEHOLD_REFRESH_SECONDS = 5
+
+def show_cart_sidebar(price_labels):
+    """Sidebar cart summary. Its own buttons rerun only the summary; adds made
+    in item cards rerun the app, so the summary only polls for other
+    household members' changes."""
+    st.header("🛍️ Shopping Cart")
+    
+    notice = st.session_state.pop('cart_notice', None)
+    if notice:
+        st.toast(notice)
+    
+    cart = st.session_state.shopping_cart
+    if isinstance(cart, HouseholdCartView):
+        show_household_changes(cart)
+    
+    if cart:
+        # The cart keeps its own running total
+        total_sen = cart.total_sen
+        total = total_sen / SEN_PER_RINGGIT
+        cart_lines = list(cart.items())
+        
+        # Convert every price, subtotal and the total in one call
+        if price_labels.active:
+            prices_sen = np.fromiter((line.price_sen for item, line in cart_lines), dtype=np.int64, count=len(cart_lines))
+            subtotals_sen = np.fromiter((line.subtotal_sen for item, line in cart_lines), dtype=np.int64, count=len(cart_lines))
+            converted = price_labels.amounts(np.concatenate([prices_sen, subtotals_sen, [total_sen]]) / SEN_PER_RINGGIT)
+            converted_prices = converted[:len(cart_lines)]
+            converted_subtotals = converted[len(cart_lines):-1]
+        
+        for position, (item, line) in enumerate(cart_lines):
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.write(f"{item}")
+                price_display = f"Qty: {line.quantity} × {format_rm(line.price_sen)}"
+                
+                # Add currency conversion if enabled
+                if price_labels.active:
+                    price_display += f" ({converted_prices[position]})"
+                
+                st.write(price_display)
+            with col2:
+                if st.button("❌", key=f"remove_{item}"):
+                    try:
+                        cart.remove_if_unchanged(item)
+                    except CartConflict:
+                        st.session_state.cart_conflict = True
+                    st.rerun(scope="fragment")
+            
+            subtotal_display = f"**{format_rm(line.subtotal_sen)}**"
+            if price_labels.active:
+                subtotal_display += f" **({converted_subtotals[position]})**"
+            
+            st.write(subtotal_display)
+            st.divider()
+        
+        total_display = f"### Total: {format_rm(total_sen)}"
+        if price_labels.active:
+            total_display += f"\n### ({converted[-1]})"
+        
+        st.write(total_display)
+        
+        if st.button("🗑️ Clear Cart"):
+            try:
+                cart.clear_if_unchanged()
+            except CartConflict:
+                st.session_state.cart_conflict = True
+            st.rerun(scope="fragment")
+        
+        if st.button("✅ Complete Purchase"):
+            try:
+                save_purchase_to_history()
+            except CartConflict:
+                st.session_state.cart_conflict = True
+                st.rerun(scope="fragment")
+            st.success("🎉 Purchase completed and saved to history!")
+            # History and analysis tabs depend on this, so rerun the whole app
+            st.rerun()
+            
+        # Remember the request: this fragment reruns on its own buttons and timer
+        if st.button("📋 Export List"):
+            st.session_state.export_requested = True
+        if st.session_state.get('export_requested'):
+            export_shopping_list(total_sen)
+            
+    else:
+        st.write("Your cart is empty")
+        st.session_state.export_requested = False
+
+# A private cart only changes in this session, so its summary is redrawn by
+# the reruns that change it; a household cart is also polled for changes
+show_private_cart_sidebar = st.fragment(key=CART_SIDEBAR_KEY)(show_cart_sidebar)
+show_household_cart_sidebar = st.fragment(run_every=HOUSEHOLD_REFRESH_SECONDS, key=CART_SIDEBAR_KEY)(show_cart_sidebar)
+
+@st.fragment
+def show_shop_item(item, price, price_labels):
+    """One Shop card; changing its quantity reruns only this card, adding
+    to the cart reruns only the sidebar cart"""
+    col1, col2, col3 = st.columns([3, 1, 1])
+    
+    with col1:
+        st.write(f"**{item}**")
+        # Add currency conversion
+        st.write(f"RM{price:.2f}{price_labels.item(item, price)}")
+    
+    with col2:
+        st.number_input("Qty", min_value=1, max_value=20, value=1, key=f"qty_{item}")
+    
+    with col3:
+        st.button("Add to Cart", key=f"add_{item}", on_click=add_from_card, args=(item, price, f"qty_{item}"))
+    
+    st.divider()
+
+def quick_add_card_key(item):
+    return f"quick_add_card_{item}"
+
+def show_category_item(item, price, categories, price_labels):
+    """One Quick Add card. Its own widgets rerun only this card; adding to
+    the cart also reruns the sidebar cart, and catalog edits rerun the
+    whole app because other lists depend on them."""
+    with st.container():
+        # Item name with edit and category management options
+        item_header_col, category_col, edit_col, remove_col = st.columns([2, 1, 0.5, 0.5])
+        
+        with item_header_col:
+            st.write(f"**{item}**")
+        
+        with category_col:
+            current_category = get_item_category(item)
+            new_category = st.selectbox(
+                "Category", 
+                categories, 
+                index=categories.index(current_category) if current_category in categories else 0,
+                key=f"cat_select_{item}",
+                help="Change item category"
+            )
+            if new_category != current_category:
+                move_item_to_category(item, new_category)
+                st.success(f"Moved {item} to {new_category}")
+                st.rerun()
+        
+        with edit_col:
+            if st.button("✏️", key=f"edit_{item}", help="Edit item"):
+                st.session_state[f"editing_{item}"] = True
+        
+        with remove_col:
+            if st.button("🗑️", key=f"remove_from_cat_{item}", help="Remove from category"):
+                # Remove from grocery items and category
+                delete_grocery_item(item)
+                st.success(f"Removed {item} from database")
+                st.rerun()
+        
+        # Check if item is being edited
+        if st.session_state.get(f"editing_{item}", False):
+            new_name = st.text_input("New name:", value=item, key=f"edit_name_{item}")
+            new_price_edit = st.number_input("New price:", value=price, min_value=0.01, step=0.10, key=f"edit_price_{item}")
+            
+            save_col, cancel_col = st.columns(2)
+            with save_col:
+                if st.button("💾 Save", key=f"save_{item}"):
+                    if new_name != item and new_name not in get_catalog_store():
+                        # Update item name, price, category and cart line
+                        rename_grocery_item(item, new_name, new_price_edit)
+                    else:
+                        # Just update price
+                        set_item_price(item, new_price_edit)
+                        st.session_state.shopping_cart.set_price(item, new_price_edit)
+                    
+                    st.session_state[f"editing_{item}"] = False
+                    st.success("✅ Item updated!")
+                    st.rerun()
+            
+            with cancel_col:
+                if st.button("❌ Cancel", key=f"cancel_{item}"):
+                    st.session_state[f"editing_{item}"] = False
+                    st.rerun(scope="fragment")
+        else:
+            # Normal display
+            st.write(f"RM{price:.2f}{price_labels.item(item, price)}")
+            
+            # Show if item is in cart
+            if item in st.session_state.shopping_cart:
+                cart_qty = st.session_state.shopping_cart[item].quantity
+                st.info(f"🛒 In cart (Qty: {cart_qty})")
+            
+            col1, col2 = st.columns([1, 1])
+            with col1:
+                st.number_input("Qty", min_value=1, max_value=20, value=1, key=f"cat_qty_{item}")
+            with col2:
+                # Rerun this card too, so its "In cart" line is current
+                st.button("Add", key=f"cat_add_{item}", on_click=add_from_card,
+                          args=(item, price, f"cat_qty_{item}", [quick_add_card_key(item)]))
+        st.divider()
+
+# Views offered in the main area
+VIEWS = ["🛒 Shop", "📦 Quick Add", "💰 Price Manager", "🗑️ Remove Items", "📊 Analysis", "📈 History", "💱 Currency Info"]
+
+def cached_view_data(view, key, compute):
+    """Reuse a view's computed data until its inputs (key) change, so switching back is instant"""
+    cache = st.session_state.view_cache
+    entry = cache.get(view)
+    if entry is None or entry[0] != key:
+        entry = (key, compute())
+        cache[view] = entry
+    return entry[1]
+
+def build_cart_dataframe():
+    """Table of cart lines for the Analysis view"""
+    cart_data = []
+    for item, line in st.session_state.shopping_cart.items():
+        cart_data.append({
+            'Item': item,
+            'Price (RM)': line.price,
+            'Quantity': line.quantity,
+            'Subtotal (RM)': line.subtotal_sen / SEN_PER_RINGGIT
+        })
+    return pd.DataFrame(cart_data)
+
+# Catalog-derived tables kept for recent catalog versions, shared by every session
+CATALOG_VIEW_CACHE_ENTRIES = 4
+
+@st.cache_resource(max_entries=CATALOG_VIEW_CACHE_ENTRIES, show_spinner=False)
+def build_category_overview(catalog_version, categories):
+    """Item count, total and average price per category (one copy per catalog version for all sessions)"""
+    catalog = get_catalog_store()
+    category_overview = {}
+    for category in categories:
+        rows_in_cat = catalog.listing(category)
+        if rows_in_cat:
+            total_value = sum(price for item, price in rows_in_cat)
+            avg_price = total_value / len(rows_in_cat)
+            category_overview[category] = {
+                'Items': len(rows_in_cat),
+                'Total Value': f"RM{total_value:.2f}",
+                'Avg Price': f"RM{avg_price:.2f}"
+            }
+        else:
+            category_overview[category] = {
+                'Items': 0,
+                'Total Value': "RM0.00",
+                'Avg Price': "RM0.00"
+            }
+    
+    return pd.DataFrame.from_dict(category_overview, orient='index')
+
+# Window of the Analysis view's price trends
+PRICE_TREND_DAYS = 30
+SECONDS_PER_DAY = 24 * 60 * 60
+
+@st.cache_resource(max_entries=CATALOG_VIEW_CACHE_ENTRIES, show_spinner=False)
+def build_price_movers(catalog_version, since, threshold_pct):
+    """Items whose price moved more than threshold_pct since `since` (shared by all sessions)"""
+    movers = get_catalog_store().price_movers(threshold_pct / 100, since)
+    return pd.DataFrame(
+        [(name, category, price_then / SEN_PER_RINGGIT, price_now / SEN_PER_RINGGIT, round(change * 100, 1))
+         for name, category, price_then, price_now, change in movers],
+        columns=['Item', 'Category', f'{PRICE_TREND_DAYS} days ago (RM)', 'Now (RM)', 'Change (%)']
+    )
 
+@st.cache_resource(max_entries=CATALOG_VIEW_CACHE_ENTRIES, show_spinner=False)
+def build_category_price_indices(catalog_version, end, categories):
+    """Daily price index per category over PRICE_TREND_DAYS days up to `end` (shared by all sessions)"""
+    timestamps = end - np.arange(PRICE_TREND_DAYS, -1, -1) * SECONDS_PER_DAY
+    indices = get_catalog_store().category_price_indices(list(categories), timestamps)
+    return pd.DataFrame(indices, index=[datetime.fromtimestamp(timestamp) for timestamp in timestamps.tolist()])
+
+def build_price_series(item):
+    """One item's price history: each price from the time it was set"""
+    timestamps, prices_sen = get_catalog_store().price_series(item)
+    return pd.Series(
+        prices_sen / SEN_PER_RINGGIT,
+        index=[datetime.fromtimestamp(timestamp) for timestamp in timestamps.tolist()],
+        name='Price (RM)'
+    )
+
+def price_step_chart(price_series):
+    """Step chart of a price series: each price holds until the next change, and the last one until now"""
+    points = price_series.rename_axis('Changed').reset_index()
+    points.loc[len(points)] = [datetime.now(), price_series.iloc[-1]]
+    return alt.Chart(points, height=200).mark_line(interpolate='step-after').encode(
+        x=alt.X('Changed:T', title=None),
+        y=alt.Y('Price (RM):Q', scale=alt.Scale(zero=False))
+    )
+
+# Number of recent purchases and top items shown in the History view
+RECENT_PURCHASES_SHOWN = 5
+TOP_ITEMS_SHOWN = 10
+
+def convert_purchase_totals(history, currency, rate_history):
+    """Every purchase total converted at the rate in force when it was made (one vectorized pass)"""
+    purchases = history.purchases()
+    rates = rate_history.as_of(currency, purchases['timestamp'].to_numpy())
+    return purchases['total_sen'].to_numpy() / SEN_PER_RINGGIT * rates
+
+def summarize_purchase_history(history, category_stats):
+    """Work out everything the History view shows from a PurchaseLog with NumPy/pandas group-bys"""
+    lines = history.lines()
+    purchases = history.purchases()
+    item_count = len(history.item_names)
+    summary = {}
+    
+    # Summary statistics (exact sums of the per-purchase totals in sen)
+    summary['total_spent_sen'] = history.total_spent_sen()
+    summary['avg_purchase_sen'] = round(summary['total_spent_sen'] / len(history))
+    
+    # Category spending, sorted with percentages
+    summary['category_df'] = None
+    if category_stats:
+        amounts_sen = np.fromiter(category_stats.values(), dtype=np.int64, count=len(category_stats))
+        category_df = pd.DataFrame({
+            'Category': list(category_stats.keys()),
+            'Amount (RM)': amounts_sen / SEN_PER_RINGGIT,
+            'Amount (sen)': amounts_sen,
+        })
+        category_df['Percentage'] = category_df['Amount (sen)'] / amounts_sen.sum() * 100
+        category_df = category_df.sort_values('Amount (sen)', ascending=False)
+        
+        display_df = category_df[['Category', 'Amount (RM)', 'Percentage']].copy()
+        display_df['Percentage'] = display_df['Percentage'].map("{:.1f}%".format)
+        display_df['Amount (RM)'] = category_df['Amount (sen)'].map(format_rm)
+        summary['category_df'] = category_df
+        summary['category_display_df'] = display_df
+    
+    # Recent purchases: the log is in checkout order, so these are just the last few ids
+    summary['recent_purchases'] = [history.purchase(purchase_id) for purchase_id in range(len(history) - 1, max(len(history) - 1 - RECENT_PURCHASES_SHOWN, -1), -1)]
+    
+    # Purchases per day (only the distinct days are turned into date objects)
+    purchase_days = purchases['day'].to_numpy()
+    days, day_counts = np.unique(purchase_days, return_counts=True)
+    summary['date_counts'] = pd.Series(day_counts, index=[date.fromordinal(day) for day in days.tolist()], name='count')
+    
+    # Average gap between consecutive purchases
+    summary['avg_days'] = None
+    if len(purchase_days) > 1:
+        summary['avg_days'] = float(np.diff(purchase_days).mean())
+    
+    # Most purchased items (a cart holds each item once, so lines per item = purchases with it)
+    item_ids = lines['item_id'].to_numpy()
+    item_frequency = np.bincount(item_ids, minlength=item_count)
+    item_quantities = np.bincount(item_ids, weights=lines['quantity'].to_numpy(), minlength=item_count)
+    
+    # Top items by frequency (ties keep first-purchased order)
+    top_items = np.argsort(-item_frequency, kind='stable')[:TOP_ITEMS_SHOWN]
+    summary['items_df'] = None
+    if len(top_items):
+        frequency = item_frequency[top_items]
+        quantity = item_quantities[top_items]
+        summary['items_df'] = pd.DataFrame({
+            'Item': [history.item_names[item_id] for item_id in top_items.tolist()],
+            'Times Purchased': frequency,
+            'Total Quantity': quantity.astype(np.int64),
+            'Avg Qty per Purchase': pd.Series(quantity / frequency).map("{:.1f}".format),
+        })
+    
+    return summary
+
+# Initialize session state
 if 'shopping_cart' not in st.session_state:
-    st.session_state.shopping_cart = {}
+    st.session_state.private_cart = st.session_state.shopping_cart = Cart()
+    st.session_state.session_id = uuid.uuid4().hex
+    st.session_state.household_member = ""
+    # A shared link (?household=...) joins that household's cart straight away
+    st.session_state.household_code = st.query_params.get('household', '')
+    join_household()
+elif isinstance(st.session_state.shopping_cart, HouseholdCartView) and st.session_state.shopping_cart.household.expired:
+    # The household cart went idle and was dropped; start a fresh one under the same code
+    join_household()
 
 if 'purchase_history' not in st.session_state:
-    st.session_state.purchase_history = []
+    st.session_state.purchase_history = PurchaseLog()
 
 if 'category_stats' not in st.session_state:
     st.session_state.category_stats = {}
 
-if 'item_categories' not in st.session_state:
-    st.session_state.item_categories = {}
+if 'category_tally' not in st.session_state:
+    st.session_state.category_tally = new_category_tally()
+
+if 'history_version' not in st.session_state:
+    st.session_state.history_version = 0
+
+if 'view_cache' not in st.session_state:
+    st.session_state.view_cache = {}
 
 def main():
     st.title("🛒 Family Grocery List & Price Checker")
     st.write("Malaysian grocery prices in MYR with real-time currency conversion")
     
+    catalog = get_catalog_store()
+    
     # Currency conversion settings in sidebar
     with st.sidebar:
         st.header("💱 Currency Settings")
         
         # Get exchange rates
-        rates = get_cached_exchange_rates()
+        rates, rates_fetched_at = get_cached_exchange_rates()
         
         if rates:
-            st.success("✅ Exchange rates updated")
-            last_update = st.session_state.get('rates_timestamp', datetime.now())
-            st.caption(f"Last updated: {last_update.strftime('%H:%M')}")
+            rate_cache = get_rate_cache()
+            if rate_cache.is_stale():
+                st.warning("⚠️ Exchange rates may be out of date")
+            else:
+                st.success("✅ Exchange rates updated")
+            st.caption(f"Last updated: {rates_fetched_at.strftime('%H:%M')} ({format_age(rates_fetched_at)})")
             
             # Currency selection
-            popular_currencies = ['USD', 'EUR', 'GBP', 'SGD', 'THB', 'IDR', 'JPY', 'CNY', 'AUD', 'INR']
-            available_currencies = [curr for curr in popular_currencies if curr in rates.keys()]
+            available_currencies = [curr for curr in POPULAR_CURRENCIES if curr in rates.keys()]
             
             selected_currency = st.selectbox(
                 "Convert prices to:",
@@ -403,142 +2392,61 @@ def main():
                         f"1 MYR = ",
                         f"{format_currency(rate, selected_currency)}"
                     )
+        elif get_rate_cache().is_fetching():
+            st.info("⏳ Loading exchange rates...")
+            st.caption("Showing MYR prices only")
+            selected_currency = 'MYR (Default)'
         else:
             st.warning("⚠️ Unable to fetch exchange rates")
             st.caption("Showing MYR prices only")
             selected_currency = 'MYR (Default)'
         
         st.divider()
+        show_household_settings()
         
-        st.header("🛍️ Shopping Cart")
-        
-        if st.session_state.shopping_cart:
-            total = 0
-            for item, details in st.session_state.shopping_cart.items():
-                qty = details['quantity']
-                price = details['price']
-                subtotal = qty * price
-                total += subtotal
-                
-                col1, col2 = st.columns([3, 1])
-                with col1:
-                    st.write(f"{item}")
-                    price_display = f"Qty: {qty} × RM{price:.2f}"
-                    
-                    # Add currency conversion if enabled
-                    if selected_currency != 'MYR (Default)' and rates:
-                        converted_price = convert_currency(price, selected_currency, rates)
-                        if converted_price:
-                            price_display += f" ({format_currency(converted_price, selected_currency)})"
-                    
-                    st.write(price_display)
-                with col2:
-                    if st.button("❌", key=f"remove_{item}"):
-                        del st.session_state.shopping_cart[item]
-                        st.rerun()
-                
-                subtotal_display = f"**RM{subtotal:.2f}**"
-                if selected_currency != 'MYR (Default)' and rates:
-                    converted_subtotal = convert_currency(subtotal, selected_currency, rates)
-                    if converted_subtotal:
-                        subtotal_display += f" **({format_currency(converted_subtotal, selected_currency)})**"
-                
-                st.write(subtotal_display)
-                st.divider()
-            
-            total_display = f"### Total: RM{total:.2f}"
-            if selected_currency != 'MYR (Default)' and rates:
-                converted_total = convert_currency(total, selected_currency, rates)
-                if converted_total:
-                    total_display += f"\n### ({format_currency(converted_total, selected_currency)})"
-            
-            st.write(total_display)
-            
-            if st.button("🗑️ Clear Cart"):
-                st.session_state.shopping_cart.clear()
-                st.rerun()
-            
-            if st.button("✅ Complete Purchase"):
-                save_purchase_to_history()
-                st.success("🎉 Purchase completed and saved to history!")
-                st.rerun()
-                
-            if st.button("📋 Export List"):
-                export_shopping_list(total)
-                
+        # Converted catalog prices are a cached lookup per (catalog version, rates)
+        price_labels = PriceLabels.for_catalog(catalog, selected_currency, rates, rates_fetched_at)
+        if isinstance(st.session_state.shopping_cart, HouseholdCartView):
+            show_household_cart_sidebar(price_labels)
         else:
-            st.write("Your cart is empty")
+            show_private_cart_sidebar(price_labels)
     
-    # Main content tabs
-    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(["🛒 Shop", "📦 Quick Add", "💰 Price Manager", "🗑️ Remove Items", "📊 Analysis", "📈 History", "💱 Currency Info"])
+    # Main content views: only the selected one is computed on each rerun
+    active_view = st.radio("View", VIEWS, horizontal=True, key="active_view", label_visibility="collapsed")
     
-    with tab1:
+    if active_view == "🛒 Shop":
         st.header("Browse Items")
         
         # Category filter
-        categories = {
-            'All': list(st.session_state.grocery_items.keys()),
-            'Rice & Grains': [k for k in st.session_state.grocery_items.keys() if any(grain in k.lower() for grain in ['rice', 'bread', 'oats'])],
-            'Proteins': [k for k in st.session_state.grocery_items.keys() if any(protein in k.lower() for protein in ['chicken', 'beef', 'fish', 'eggs', 'tofu'])],
-            'Dairy': [k for k in st.session_state.grocery_items.keys() if any(dairy in k.lower() for dairy in ['milk', 'yogurt', 'cheese', 'butter'])],
-            'Vegetables': [k for k in st.session_state.grocery_items.keys() if any(veg in k.lower() for veg in ['potatoes', 'onions', 'carrots', 'cabbage', 'tomatoes', 'cucumber', 'spinach', 'broccoli'])],
-            'Fruits': [k for k in st.session_state.grocery_items.keys() if any(fruit in k.lower() for fruit in ['banana', 'apple', 'orange', 'watermelon', 'papaya', 'mango'])],
-            'Pantry': [k for k in st.session_state.grocery_items.keys() if any(pantry in k.lower() for pantry in ['oil', 'sauce', 'salt', 'sugar', 'flour', 'garlic', 'ginger'])],
-            'Beverages': [k for k in st.session_state.grocery_items.keys() if any(bev in k.lower() for bev in ['coffee', 'tea', 'juice', 'water'])],
-            'Household': [k for k in st.session_state.grocery_items.keys() if any(house in k.lower() for house in ['dish', 'detergent', 'toilet', 'shampoo'])]
-        }
+        filter_options = ['All'] + CATEGORIES
+        if catalog.listing('Other'):
+            filter_options.append('Other')
         
-        selected_category = st.selectbox("Filter by category:", list(categories.keys()))
+        selected_category = st.selectbox("Filter by category:", filter_options)
         
         # Search
         search_term = st.text_input("🔍 Search items:")
         
         # Filter items
-        items_to_show = categories[selected_category]
+        category_filter = None if selected_category == 'All' else selected_category
         if search_term:
-            items_to_show = [item for item in items_to_show if search_term.lower() in item.lower()]
+            match_count, items_to_show = catalog.search(search_term, category_filter)
+            if match_count > len(items_to_show):
+                st.caption(f"Showing the best {len(items_to_show)} of {match_count} matches")
+        else:
+            items_to_show = catalog.listing(category_filter)
         
-        # Display items
-        for item in sorted(items_to_show):
-            price = st.session_state.grocery_items[item]
-            
-            col1, col2, col3 = st.columns([3, 1, 1])
-            
-            with col1:
-                st.write(f"**{item}**")
-                price_display = f"RM{price:.2f}"
-                
-                # Add currency conversion
-                if selected_currency != 'MYR (Default)' and rates:
-                    converted_price = convert_currency(price, selected_currency, rates)
-                    if converted_price:
-                        price_display += f" ({format_currency(converted_price, selected_currency)})"
-                
-                st.write(price_display)
-            
-            with col2:
-                quantity = st.number_input("Qty", min_value=1, max_value=20, value=1, key=f"qty_{item}")
-            
-            with col3:
-                if st.button("Add to Cart", key=f"add_{item}"):
-                    if item in st.session_state.shopping_cart:
-                        st.session_state.shopping_cart[item]['quantity'] += quantity
-                    else:
-                        st.session_state.shopping_cart[item] = {
-                            'price': price,
-                            'quantity': quantity
-                        }
-                    st.success(f"Added {quantity}x {item}")
-                    st.rerun()
-            
-            st.divider()
+        # Display only the current page of items
+        start, stop = show_page_controls(len(items_to_show), "shop", (selected_category, search_term))
+        for item, price in items_to_show[start:stop]:
+            show_shop_item(item, price, price_labels)
     
-    with tab2:
+    if active_view == "📦 Quick Add":
         st.header("📦 Quick Add by Category")
         st.write("Quickly add items by browsing categories or add new items to specific categories")
         
         # Category selection
-        categories = ['Rice & Grains', 'Proteins', 'Dairy', 'Vegetables', 'Fruits', 'Pantry', 'Beverages', 'Household']
+        categories = CATEGORIES
         
         selected_cat = st.selectbox("🏷️ Select Category:", categories)
         
@@ -556,14 +2464,13 @@ def main():
             
             with col3:
                 if st.button(f"Add to {selected_cat}", key=f"add_new_{selected_cat}"):
-                    if new_item_name and new_item_name not in st.session_state.grocery_items:
+                    if new_item_name and new_item_name not in catalog:
                         # Add item with category assignment
                         item_name = new_item_name.strip()
-                        st.session_state.grocery_items[item_name] = new_item_price
-                        set_item_category(item_name, selected_cat)  # Explicitly assign to category
+                        add_grocery_item(item_name, new_item_price, selected_cat)  # Explicitly assign to category
                         st.success(f"✅ Added '{item_name}' to {selected_cat} category at RM{new_item_price:.2f}")
                         st.rerun()
-                    elif new_item_name in st.session_state.grocery_items:
+                    elif new_item_name in catalog:
                         st.error("❌ Item already exists in the database!")
                     else:
                         st.error("❌ Please enter an item name")
@@ -571,7 +2478,8 @@ def main():
             st.divider()
             
             # Show existing items in category
-            category_items = get_category_items(selected_cat)
+            category_prices = dict(catalog.listing(selected_cat))
+            category_items = list(category_prices)
             
             if category_items:
                 st.subheader(f"🛒 Existing {selected_cat} Items ({len(category_items)} items)")
@@ -584,15 +2492,8 @@ def main():
                     if st.button(f"🛒 Add All {selected_cat} Items (Qty: 1)", key=f"add_all_{selected_cat}"):
                         added_count = 0
                         for item in category_items:
-                            if item not in st.session_state.shopping_cart:
-                                st.session_state.shopping_cart[item] = {
-                                    'price': st.session_state.grocery_items[item],
-                                    'quantity': 1
-                                }
-                                added_count += 1
-                            else:
-                                st.session_state.shopping_cart[item]['quantity'] += 1
-                                added_count += 1
+                            add_to_cart(item, category_prices[item], 1)
+                            added_count += 1
                         st.success(f"✅ Added {added_count} {selected_cat.lower()} items to cart!")
                         st.rerun()
                 
@@ -601,15 +2502,8 @@ def main():
                     if st.button(f"🛒 Add All {selected_cat} (Qty: {common_qty})", key=f"add_all_qty_{selected_cat}"):
                         added_count = 0
                         for item in category_items:
-                            if item not in st.session_state.shopping_cart:
-                                st.session_state.shopping_cart[item] = {
-                                    'price': st.session_state.grocery_items[item],
-                                    'quantity': common_qty
-                                }
-                                added_count += 1
-                            else:
-                                st.session_state.shopping_cart[item]['quantity'] += common_qty
-                                added_count += 1
+                            add_to_cart(item, category_prices[item], common_qty)
+                            added_count += 1
                         st.success(f"✅ Added {added_count} {selected_cat.lower()} items (qty: {common_qty}) to cart!")
                         st.rerun()
                 
@@ -619,112 +2513,12 @@ def main():
                 cols = st.columns(2)
                 
                 for i, item in enumerate(category_items):
-                    price = st.session_state.grocery_items[item]
+                    price = category_prices[item]
                     col = cols[i % 2]
                     
                     with col:
-                        with st.container():
-                            # Item name with edit and category management options
-                            item_header_col, category_col, edit_col, remove_col = st.columns([2, 1, 0.5, 0.5])
-                            
-                            with item_header_col:
-                                st.write(f"**{item}**")
-                            
-                            with category_col:
-                                current_category = get_item_category(item)
-                                new_category = st.selectbox(
-                                    "Category", 
-                                    categories, 
-                                    index=categories.index(current_category) if current_category in categories else 0,
-                                    key=f"cat_select_{item}",
-                                    help="Change item category"
-                                )
-                                if new_category != current_category:
-                                    move_item_to_category(item, new_category)
-                                    st.success(f"Moved {item} to {new_category}")
-                                    st.rerun()
-                            
-                            with edit_col:
-                                if st.button("✏️", key=f"edit_{item}", help="Edit item"):
-                                    st.session_state[f"editing_{item}"] = True
-                            
-                            with remove_col:
-                                if st.button("🗑️", key=f"remove_from_cat_{item}", help="Remove from category"):
-                                    # Remove from grocery items and category
-                                    if item in st.session_state.shopping_cart:
-                                        del st.session_state.shopping_cart[item]
-                                    del st.session_state.grocery_items[item]
-                                    remove_item_from_category(item)
-                                    st.success(f"Removed {item} from database")
-                                    st.rerun()
-                            
-                            # Check if item is being edited
-                            if st.session_state.get(f"editing_{item}", False):
-                                new_name = st.text_input("New name:", value=item, key=f"edit_name_{item}")
-                                new_price_edit = st.number_input("New price:", value=price, min_value=0.01, step=0.10, key=f"edit_price_{item}")
-                                
-                                save_col, cancel_col = st.columns(2)
-                                with save_col:
-                                    if st.button("💾 Save", key=f"save_{item}"):
-                                        if new_name != item and new_name not in st.session_state.grocery_items:
-                                            # Update item name and price
-                                            del st.session_state.grocery_items[item]
-                                            st.session_state.grocery_items[new_name] = new_price_edit
-                                            
-                                            # Update category assignment
-                                            if item in st.session_state.item_categories:
-                                                st.session_state.item_categories[new_name] = st.session_state.item_categories[item]
-                                                del st.session_state.item_categories[item]
-                                            
-                                            # Update in cart if present
-                                            if item in st.session_state.shopping_cart:
-                                                cart_data = st.session_state.shopping_cart[item]
-                                                del st.session_state.shopping_cart[item]
-                                                st.session_state.shopping_cart[new_name] = cart_data
-                                                st.session_state.shopping_cart[new_name]['price'] = new_price_edit
-                                        else:
-                                            # Just update price
-                                            st.session_state.grocery_items[item] = new_price_edit
-                                            if item in st.session_state.shopping_cart:
-                                                st.session_state.shopping_cart[item]['price'] = new_price_edit
-                                        
-                                        st.session_state[f"editing_{item}"] = False
-                                        st.success("✅ Item updated!")
-                                        st.rerun()
-                                
-                                with cancel_col:
-                                    if st.button("❌ Cancel", key=f"cancel_{item}"):
-                                        st.session_state[f"editing_{item}"] = False
-                                        st.rerun()
-                            else:
-                                # Normal display
-                                price_display = f"RM{price:.2f}"
-                                if selected_currency != 'MYR (Default)' and rates:
-                                    converted_price = convert_currency(price, selected_currency, rates)
-                                    if converted_price:
-                                        price_display += f" ({format_currency(converted_price, selected_currency)})"
-                                st.write(price_display)
-                                
-                                # Show if item is in cart
-                                if item in st.session_state.shopping_cart:
-                                    cart_qty = st.session_state.shopping_cart[item]['quantity']
-                                    st.info(f"🛒 In cart (Qty: {cart_qty})")
-                                
-                                col1, col2 = st.columns([1, 1])
-                                with col1:
-                                    qty = st.number_input("Qty", min_value=1, max_value=20, value=1, key=f"cat_qty_{item}")
-                                with col2:
-                                    if st.button("Add", key=f"cat_add_{item}"):
-                                        if item in st.session_state.shopping_cart:
-                                            st.session_state.shopping_cart[item]['quantity'] += qty
-                                        else:
-                                            st.session_state.shopping_cart[item] = {
-                                                'price': price,
-                                                'quantity': qty
-                                            }
-                                        st.success(f"Added {qty}x {item}")
-                                        st.rerun()
-                            st.divider()
+                        # Each card is its own keyed fragment, so an add can rerun just that card
+                        st.fragment(key=quick_add_card_key(item))(show_category_item)(item, price, categories, price_labels)
             else:
                 st.info(f"No items found in {selected_cat} category. Add the first item above!")
                 
@@ -748,8 +2542,7 @@ def main():
                     if source_category != target_category:
                         source_items = get_category_items(source_category)
                         if source_items:
-                            for item in source_items:
-                                move_item_to_category(item, target_category)
+                            move_items_to_category(source_items, target_category)
                             st.success(f"✅ Moved {len(source_items)} items from {source_category} to {target_category}")
                             st.rerun()
                         else:
@@ -759,7 +2552,7 @@ def main():
             
             # Individual item moving
             st.write("**Move Individual Items:**")
-            all_items = list(st.session_state.grocery_items.keys())
+            all_items = list(catalog.keys())
             
             if all_items:
                 selected_item = st.selectbox("Select item to move:", all_items, key="move_item")
@@ -787,12 +2580,12 @@ def main():
             st.warning("⚠️ This will permanently delete items from the database!")
             
             remove_category = st.selectbox("Select category to clear:", categories, key="remove_cat")
-            items_in_remove_cat = get_category_items(remove_category)
+            remove_rows = catalog.listing(remove_category)
+            items_in_remove_cat = [item for item, price in remove_rows]
             
             if items_in_remove_cat:
                 st.write(f"**Items to be removed from {remove_category}:**")
-                for item in items_in_remove_cat:
-                    price = st.session_state.grocery_items[item]
+                for item, price in remove_rows:
                     st.write(f"• {item} - RM{price:.2f}")
                 
                 col1, col2 = st.columns(2)
@@ -800,11 +2593,7 @@ def main():
                 with col1:
                     if st.button(f"🗑️ Remove All {len(items_in_remove_cat)} Items", type="secondary"):
                         # Remove all items from category
-                        for item in items_in_remove_cat:
-                            if item in st.session_state.shopping_cart:
-                                del st.session_state.shopping_cart[item]
-                            del st.session_state.grocery_items[item]
-                            remove_item_from_category(item)
+                        delete_grocery_items(items_in_remove_cat)
                         st.success(f"✅ Removed all {len(items_in_remove_cat)} items from {remove_category}")
                         st.rerun()
                 
@@ -814,37 +2603,18 @@ def main():
                 st.info(f"No items in {remove_category} category to remove")
         
         with st.expander("📊 Category Overview"):
-            category_overview = {}
-            for category in categories:
-                items_in_cat = get_category_items(category)
-                if items_in_cat:
-                    total_value = sum(st.session_state.grocery_items[item] for item in items_in_cat)
-                    avg_price = total_value / len(items_in_cat)
-                    category_overview[category] = {
-                        'Items': len(items_in_cat),
-                        'Total Value': f"RM{total_value:.2f}",
-                        'Avg Price': f"RM{avg_price:.2f}"
-                    }
-                else:
-                    category_overview[category] = {
-                        'Items': 0,
-                        'Total Value': "RM0.00",
-                        'Avg Price': "RM0.00"
-                    }
-            
-            overview_df = pd.DataFrame.from_dict(category_overview, orient='index')
+            overview_df = build_category_overview(catalog.version(), tuple(categories))
             st.dataframe(overview_df, use_container_width=True)
             
             # Most expensive items per category
             st.write("**Most Expensive Item per Category:**")
             for category in categories:
-                items_in_cat = get_category_items(category)
-                if items_in_cat:
-                    most_expensive = max(items_in_cat, key=lambda x: st.session_state.grocery_items[x])
-                    price = st.session_state.grocery_items[most_expensive]
+                rows_in_cat = catalog.listing(category)
+                if rows_in_cat:
+                    most_expensive, price = max(rows_in_cat, key=lambda row: row[1])
                     st.write(f"• **{category}**: {most_expensive} (RM{price:.2f})")
 
-    with tab3:
+    if active_view == "💰 Price Manager":
         st.header("Manage Prices")
         st.write("Update item prices or add new items")
         
@@ -852,13 +2622,18 @@ def main():
         
         with col1:
             st.subheader("Update Existing Item")
-            item_to_update = st.selectbox("Select item:", list(st.session_state.grocery_items.keys()))
-            current_price = st.session_state.grocery_items[item_to_update]
+            item_to_update = st.selectbox("Select item:", list(catalog.keys()))
+            current_price = catalog[item_to_update]
             new_price = st.number_input("New price (RM):", value=current_price, min_value=0.01, step=0.10)
             
             if st.button("Update Price"):
-                st.session_state.grocery_items[item_to_update] = new_price
+                set_item_price(item_to_update, new_price)
                 st.success(f"Updated {item_to_update} to RM{new_price:.2f}")
+            
+            price_series = build_price_series(item_to_update)
+            if len(price_series) > 1:
+                st.caption(f"Price history ({len(price_series)} prices)")
+                st.altair_chart(price_step_chart(price_series), use_container_width=True)
         
         with col2:
             st.subheader("Add New Item")
@@ -866,49 +2641,69 @@ def main():
             new_item_price = st.number_input("Price (RM):", min_value=0.01, step=0.10, value=1.00)
             
             if st.button("Add Item"):
-                if new_item_name and new_item_name not in st.session_state.grocery_items:
-                    st.session_state.grocery_items[new_item_name] = new_item_price
+                if new_item_name and new_item_name not in catalog:
+                    add_grocery_item(new_item_name, new_item_price)
                     st.success(f"Added {new_item_name} at RM{new_item_price:.2f}")
-                elif new_item_name in st.session_state.grocery_items:
+                elif new_item_name in catalog:
                     st.error("Item already exists!")
                 else:
                     st.error("Please enter an item name")
+        
+        st.divider()
+        st.subheader("Import Price List")
+        st.caption("A CSV or JSON Lines file with item, price and (optional) category columns, "
+                   "like the catalog export. New items are added and existing ones repriced.")
+        price_list = st.file_uploader(
+            "Price list:", type=[extension.lstrip('.') for extensions in IMPORT_FORMATS.values() for extension in extensions]
+        )
+        
+        if price_list is not None and st.button("Import Prices"):
+            started = time.perf_counter()
+            try:
+                report = import_price_list(price_list, price_list.name)
+            except ValueError as error:
+                st.error(f"Could not import {price_list.name}: {error}. Nothing was changed.")
+            else:
+                seconds = time.perf_counter() - started
+                st.success(f"Imported {report.accepted:,} items in {seconds:.1f}s")
+                if report.rejected:
+                    st.warning(f"Skipped {report.rejected:,} invalid rows"
+                               + (f" (first {len(report.rejected_rows)} shown)" if report.rejected > len(report.rejected_rows) else ""))
+                    st.dataframe(pd.DataFrame(
+                        [(line_number, reason, str(row)) for line_number, reason, row in report.rejected_rows],
+                        columns=['Line', 'Problem', 'Row']
+                    ), use_container_width=True, hide_index=True)
     
-    with tab4:
+    if active_view == "🗑️ Remove Items":
         st.header("Remove Items from Master List")
         st.write("Permanently remove items from the grocery database")
         
-        if len(st.session_state.grocery_items) > 0:
+        if len(catalog) > 0:
             # Search for items to remove
             st.subheader("Search & Remove Items")
             remove_search = st.text_input("🔍 Search items to remove:", key="remove_search")
             
             # Filter items based on search
-            items_to_show = list(st.session_state.grocery_items.keys())
             if remove_search:
-                items_to_show = [item for item in items_to_show if remove_search.lower() in item.lower()]
+                match_count, items_to_show = catalog.search(remove_search)
+            else:
+                items_to_show = catalog.listing()
+                match_count = len(items_to_show)
             
             # Show items with remove buttons
             if items_to_show:
-                st.write(f"Found {len(items_to_show)} item(s)")
+                st.write(f"Found {match_count} item(s)")
                 
-                # Create columns for better layout
-                for i, item in enumerate(sorted(items_to_show)):
-                    price = st.session_state.grocery_items[item]
-                    
+                # Create columns for better layout, one page at a time
+                start, stop = show_page_controls(len(items_to_show), "remove", remove_search)
+                for i, (item, price) in enumerate(items_to_show[start:stop], start):
                     col1, col2, col3 = st.columns([4, 1, 1])
                     
                     with col1:
                         st.write(f"**{item}**")
-                        price_display = f"RM{price:.2f}"
                         
                         # Add currency conversion
-                        if selected_currency != 'MYR (Default)' and rates:
-                            converted_price = convert_currency(price, selected_currency, rates)
-                            if converted_price:
-                                price_display += f" ({format_currency(converted_price, selected_currency)})"
-                        
-                        st.write(price_display)
+                        st.write(f"RM{price:.2f}{price_labels.item(item, price)}")
                     
                     with col2:
                         # Show if item is in cart
@@ -919,11 +2714,8 @@ def main():
                     
                     with col3:
                         if st.button("🗑️ Remove", key=f"remove_item_{i}_{item}"):
-                            # Remove from shopping cart if present
-                            if item in st.session_state.shopping_cart:
-                                del st.session_state.shopping_cart[item]
-                            # Remove from master list
-                            del st.session_state.grocery_items[item]
+                            # Remove from master list and shopping cart
+                            delete_grocery_item(item)
                             st.success(f"Removed {item} from database")
                             st.rerun()
                     
@@ -937,46 +2729,24 @@ def main():
             # Bulk remove section
             st.subheader("Bulk Remove by Category")
             
-            # Category selection for bulk removal
-            categories = {
-                'Rice & Grains': [k for k in st.session_state.grocery_items.keys() if any(grain in k.lower() for grain in ['rice', 'bread', 'oats'])],
-                'Proteins': [k for k in st.session_state.grocery_items.keys() if any(protein in k.lower() for protein in ['chicken', 'beef', 'fish', 'eggs', 'tofu'])],
-                'Dairy': [k for k in st.session_state.grocery_items.keys() if any(dairy in k.lower() for dairy in ['milk', 'yogurt', 'cheese', 'butter'])],
-                'Vegetables': [k for k in st.session_state.grocery_items.keys() if any(veg in k.lower() for veg in ['potatoes', 'onions', 'carrots', 'cabbage', 'tomatoes', 'cucumber', 'spinach', 'broccoli'])],
-                'Fruits': [k for k in st.session_state.grocery_items.keys() if any(fruit in k.lower() for fruit in ['banana', 'apple', 'orange', 'watermelon', 'papaya', 'mango'])],
-                'Pantry': [k for k in st.session_state.grocery_items.keys() if any(pantry in k.lower() for pantry in ['oil', 'sauce', 'salt', 'sugar', 'flour', 'garlic', 'ginger'])],
-                'Beverages': [k for k in st.session_state.grocery_items.keys() if any(bev in k.lower() for bev in ['coffee', 'tea', 'juice', 'water'])],
-                'Household': [k for k in st.session_state.grocery_items.keys() if any(house in k.lower() for house in ['dish', 'detergent', 'toilet', 'shampoo'])]
-            }
-            
-            category_to_remove = st.selectbox("Select category to remove:", [''] + list(categories.keys()), key="bulk_remove")
+            category_to_remove = st.selectbox("Select category to remove:", [''] + CATEGORIES, key="bulk_remove")
             
-            if category_to_remove and category_to_remove in categories:
-                items_in_category = categories[category_to_remove]
+            if category_to_remove:
+                category_rows = catalog.listing(category_to_remove)
+                items_in_category = [item for item, price in category_rows]
                 if items_in_category:
                     st.write(f"This will remove {len(items_in_category)} items from the {category_to_remove} category:")
                     
                     # Show items that will be removed
                     with st.expander(f"View {len(items_in_category)} items to be removed"):
-                        for item in items_in_category:
-                            price_display = f"• {item} - RM{st.session_state.grocery_items[item]:.2f}"
-                            
-                            # Add currency conversion
-                            if selected_currency != 'MYR (Default)' and rates:
-                                converted_price = convert_currency(st.session_state.grocery_items[item], selected_currency, rates)
-                                if converted_price:
-                                    price_display += f" ({format_currency(converted_price, selected_currency)})"
-                            
-                            st.write(price_display)
+                        for item, price in category_rows:
+                            st.write(f"• {item} - RM{price:.2f}{price_labels.item(item, price)}")
                     
                     col1, col2 = st.columns(2)
                     with col1:
                         if st.button(f"⚠️ Remove All {category_to_remove} Items", type="secondary"):
-                            # Remove items from cart first
-                            for item in items_in_category:
-                                if item in st.session_state.shopping_cart:
-                                    del st.session_state.shopping_cart[item]
-                                del st.session_state.grocery_items[item]
+                            # Remove items from the master list and cart
+                            delete_grocery_items(items_in_category)
                             st.success(f"Removed all {len(items_in_category)} items from {category_to_remove}")
                             st.rerun()
                 else:
@@ -988,7 +2758,7 @@ def main():
                 st.warning("This will remove ALL items from the grocery database and clear your shopping cart!")
                 if st.button("🔄 Reset All Data", type="secondary"):
                     if st.button("✅ Confirm Reset", type="primary"):
-                        st.session_state.grocery_items.clear()
+                        catalog.clear()
                         st.session_state.shopping_cart.clear()
                         # Reload default items
                         load_default_items()
@@ -1000,21 +2770,13 @@ def main():
                 load_default_items()
                 st.rerun()
 
-    with tab5:
+    if active_view == "📊 Analysis":
         st.header("Price Analysis")
         
         if st.session_state.shopping_cart:
-            # Create dataframe for analysis
-            cart_data = []
-            for item, details in st.session_state.shopping_cart.items():
-                cart_data.append({
-                    'Item': item,
-                    'Price (RM)': details['price'],
-                    'Quantity': details['quantity'],
-                    'Subtotal (RM)': details['price'] * details['quantity']
-                })
-            
-            df = pd.DataFrame(cart_data)
+            # Create dataframe for analysis (reused until the cart changes)
+            cart_key = st.session_state.shopping_cart.content_hash()
+            df = cached_view_data('analysis', cart_key, build_cart_dataframe)
             st.dataframe(df, use_container_width=True)
             
             # Summary statistics
@@ -1024,66 +2786,83 @@ def main():
                 st.metric("Total Items", len(st.session_state.shopping_cart))
             
             with col2:
-                total_qty = sum(details['quantity'] for details in st.session_state.shopping_cart.values())
-                st.metric("Total Quantity", total_qty)
+                st.metric("Total Quantity", st.session_state.shopping_cart.total_quantity)
             
             with col3:
-                total_cost = sum(details['price'] * details['quantity'] for details in st.session_state.shopping_cart.values())
-                total_display = f"RM{total_cost:.2f}"
+                total_cost_sen = st.session_state.shopping_cart.total_sen
+                total_display = format_rm(total_cost_sen)
                 
                 # Add currency conversion
-                if selected_currency != 'MYR (Default)' and rates:
-                    converted_total = convert_currency(total_cost, selected_currency, rates)
-                    if converted_total:
-                        total_display += f"\n({format_currency(converted_total, selected_currency)})"
+                if price_labels.active:
+                    total_display += f"\n({price_labels.amount(total_cost_sen / SEN_PER_RINGGIT)})"
                 
                 st.metric("Total Cost", total_display)
             
             # Price breakdown chart
-            if len(cart_data) > 0:
+            if len(df) > 0:
                 st.subheader("Spending Breakdown")
                 chart_data = df.set_index('Item')['Subtotal (RM)']
                 st.bar_chart(chart_data)
         else:
             st.info("Add items to your cart to see analysis")
+        
+        st.subheader("📉 Price Trends")
+        threshold_pct = st.number_input("Show items whose price moved more than (%):", min_value=1, max_value=1000, value=10, step=5)
+        
+        # Whole minutes, so reruns within a minute share the cached tables
+        now = int(time.time()) // 60 * 60
+        movers_df = build_price_movers(catalog.version(), now - PRICE_TREND_DAYS * SECONDS_PER_DAY, threshold_pct)
+        if len(movers_df) > 0:
+            st.write(f"{len(movers_df)} items moved more than {threshold_pct}% in the last {PRICE_TREND_DAYS} days")
+            st.dataframe(movers_df, use_container_width=True, hide_index=True)
+        else:
+            st.info(f"No item's price moved more than {threshold_pct}% in the last {PRICE_TREND_DAYS} days")
+        
+        st.caption(f"Category price index (100 = prices {PRICE_TREND_DAYS} days ago)")
+        st.line_chart(build_category_price_indices(catalog.version(), now, tuple(CATEGORIES + ['Other'])))
 
-    with tab6:
+    if active_view == "📈 History":
         st.header("📈 Purchase History & Trends")
         
         if st.session_state.purchase_history:
             st.success(f"📊 Total purchases recorded: {len(st.session_state.purchase_history)}")
             
+            # Pick up category changes made since the last purchase
+            if sync_category_stats():
+                st.session_state.history_version += 1
+            
+            # Everything below is computed once per history version
+            summary = cached_view_data('history', st.session_state.history_version, lambda: summarize_purchase_history(st.session_state.purchase_history, st.session_state.category_stats))
+            
             # Summary statistics
-            total_spent = sum(purchase['total'] for purchase in st.session_state.purchase_history)
-            avg_purchase = total_spent / len(st.session_state.purchase_history)
+            total_spent_sen = summary['total_spent_sen']
+            avg_purchase_sen = summary['avg_purchase_sen']
             
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Total Spent", f"RM{total_spent:.2f}")
+                st.metric("Total Spent", format_rm(total_spent_sen))
             with col2:
-                st.metric("Average Purchase", f"RM{avg_purchase:.2f}")
+                st.metric("Average Purchase", format_rm(avg_purchase_sen))
             with col3:
                 st.metric("Total Purchases", len(st.session_state.purchase_history))
             
+            # Totals at the rates of the day each purchase was made
+            historical_totals = None
+            if price_labels.active:
+                rate_history = get_rate_history()
+                historical_totals = cached_view_data(
+                    'history_rates',
+                    (st.session_state.history_version, price_labels.currency, len(rate_history)),
+                    lambda: convert_purchase_totals(st.session_state.purchase_history, price_labels.currency, rate_history)
+                )
+                if not np.isnan(historical_totals).all():
+                    st.metric(f"Total Spent in {price_labels.currency} (at purchase-time rates)",
+                              format_currency(np.nansum(historical_totals), price_labels.currency))
+            
             # Category spending analysis
-            if st.session_state.category_stats:
+            if summary['category_df'] is not None:
                 st.subheader("🥧 Spending by Category")
-                
-                # Prepare data for pie chart
-                categories = list(st.session_state.category_stats.keys())
-                amounts = list(st.session_state.category_stats.values())
-                
-                # Calculate percentages
-                total_category_spending = sum(amounts)
-                percentages = [(amount/total_category_spending)*100 for amount in amounts]
-                
-                # Create DataFrame for charts
-                category_df = pd.DataFrame({
-                    'Category': categories,
-                    'Amount (RM)': amounts,
-                    'Percentage': percentages
-                })
-                category_df = category_df.sort_values('Amount (RM)', ascending=False)
+                category_df = summary['category_df']
                 
                 # Display pie chart using bar chart (Streamlit doesn't have native pie charts)
                 st.subheader("💰 Category Spending Distribution")
@@ -1092,9 +2871,7 @@ def main():
                 
                 # Percentage breakdown table
                 st.subheader("📊 Detailed Breakdown")
-                display_df = category_df.copy()
-                display_df['Percentage'] = display_df['Percentage'].apply(lambda x: f"{x:.1f}%")
-                display_df['Amount (RM)'] = display_df['Amount (RM)'].apply(lambda x: f"RM{x:.2f}")
+                display_df = summary['category_display_df']
                 st.dataframe(display_df, use_container_width=True, hide_index=True)
                 
                 # Top spending category
@@ -1103,55 +2880,58 @@ def main():
             
             # Recent purchases
             st.subheader("🕒 Recent Purchases")
-            recent_purchases = sorted(st.session_state.purchase_history, key=lambda x: x['date'], reverse=True)[:5]
+            recent_purchases = summary['recent_purchases']
             
             for i, purchase in enumerate(recent_purchases):
-                with st.expander(f"Purchase #{len(st.session_state.purchase_history)-i} - {purchase['date']} (RM{purchase['total']:.2f})"):
+                purchase_id = len(st.session_state.purchase_history) - 1 - i
+                total_label = format_rm(purchase['total_sen'])
+                if historical_totals is not None and not np.isnan(historical_totals[purchase_id]):
+                    total_label += f", {format_currency(historical_totals[purchase_id], price_labels.currency)} then"
+                with st.expander(f"Purchase #{len(st.session_state.purchase_history)-i} - {purchase['date']} ({total_label})"):
                     for item, details in purchase['items'].items():
-                        st.write(f"• {item} - Qty: {details['quantity']} × RM{details['price']:.2f} = RM{details['price'] * details['quantity']:.2f}")
+                        st.write(f"• {item} - Qty: {details['quantity']} × {format_rm(details['price_sen'])} = {format_rm(details['price_sen'] * details['quantity'])}")
+            
+            # Receipts are rendered (in parallel) only when the button is clicked
+            history = st.session_state.purchase_history
+            purchase_count = len(history)
+            pdf_pool = get_pdf_pool()
+            st.download_button(
+                label=f"🧾 Download All Receipts (PDF, {purchase_count} files)",
+                data=lambda: build_receipts_zip(history, purchase_count, pdf_pool),
+                file_name=f"grocery_receipts_{datetime.now().strftime('%Y%m%d_%H%M')}.zip",
+                mime="application/zip"
+            )
+            
+            # Raw data for downstream analysis, exported only when a button is clicked
+            st.subheader("💾 Export Data")
+            export_format = st.selectbox("Format:", list(EXPORT_FORMATS), key="history_export_format")
+            col1, col2 = st.columns(2)
+            with col1:
+                data_export_button(f"📜 Purchase History ({history.line_count} lines)", export_format, "grocery_purchases",
+                                   PURCHASE_LINE_COLUMNS, lambda: purchase_line_batches(history))
+            with col2:
+                store = get_catalog_store()
+                data_export_button(f"📦 Catalog ({len(store)} items)", export_format, "grocery_catalog",
+                                   CATALOG_COLUMNS, store.export_batches)
             
             # Purchase frequency analysis
             st.subheader("📅 Purchase Frequency")
             
             # Group purchases by date
-            purchase_dates = [datetime.strptime(p['date'].split(' ')[0], '%Y-%m-%d').date() for p in st.session_state.purchase_history]
-            date_counts = pd.Series(purchase_dates).value_counts().sort_index()
+            date_counts = summary['date_counts']
             
             if len(date_counts) > 1:
                 st.line_chart(date_counts)
                 
-                # Calculate average days between purchases
-                if len(purchase_dates) > 1:
-                    date_diffs = [(purchase_dates[i] - purchase_dates[i+1]).days for i in range(len(purchase_dates)-1)]
-                    avg_days = sum(date_diffs) / len(date_diffs)
-                    st.info(f"📈 **Average days between purchases**: {avg_days:.1f} days")
+                # Average days between purchases
+                if summary['avg_days'] is not None:
+                    st.info(f"📈 **Average days between purchases**: {summary['avg_days']:.1f} days")
             
             # Most purchased items
             st.subheader("🥇 Most Purchased Items")
-            item_frequency = {}
-            item_quantities = {}
-            
-            for purchase in st.session_state.purchase_history:
-                for item, details in purchase['items'].items():
-                    if item not in item_frequency:
-                        item_frequency[item] = 0
-                        item_quantities[item] = 0
-                    item_frequency[item] += 1
-                    item_quantities[item] += details['quantity']
-            
-            # Top 10 most frequent items
-            top_items = sorted(item_frequency.items(), key=lambda x: x[1], reverse=True)[:10]
-            
-            if top_items:
-                items_df = pd.DataFrame([
-                    {
-                        'Item': item,
-                        'Times Purchased': freq,
-                        'Total Quantity': item_quantities[item],
-                        'Avg Qty per Purchase': f"{item_quantities[item]/freq:.1f}"
-                    }
-                    for item, freq in top_items
-                ])
+            items_df = summary['items_df']
+            
+            if items_df is not None:
                 st.dataframe(items_df, use_container_width=True, hide_index=True)
             
             # Clear history option
@@ -1161,9 +2941,19 @@ def main():
                 if st.button("🗑️ Clear All History", type="secondary"):
                     if st.button("✅ Confirm Clear History", type="primary"):
                         st.session_state.purchase_history.clear()
-                        st.session_state.category_stats.clear()
+                        reset_category_stats()
+                        st.session_state.history_version += 1
                         st.success("✅ Purchase history cleared!")
                         st.rerun()
+            
+            with st.expander("Check Category Totals"):
+                if st.button("🔍 Verify against full recompute"):
+                    mismatches = verify_category_stats()
+                    if mismatches:
+                        st.error(f"❌ {len(mismatches)} category totals differ from a full recompute")
+                        st.json({category: {'running': running, 'recomputed': recomputed} for category, (running, recomputed) in mismatches.items()})
+                    else:
+                        st.success("✅ Running category totals match a full recompute")
         
         else:
             st.info("📝 No purchase history yet. Complete a purchase to start tracking your grocery trends!")
@@ -1173,26 +2963,23 @@ def main():
             st.write("3. Your purchase will be saved to history")
             st.write("4. Come back here to see your spending trends!")
 
-    with tab7:
+    if active_view == "💱 Currency Info":
         st.header("💱 Currency Conversion Information")
         
-        rates = get_cached_exchange_rates()
-        
         if rates:
             st.success("✅ Real-time exchange rates loaded successfully!")
             
             # Display last update time
-            if 'rates_timestamp' in st.session_state:
-                last_update = st.session_state.rates_timestamp
-                st.info(f"📅 Last updated: {last_update.strftime('%Y-%m-%d %H:%M:%S')}")
+            rate_cache = get_rate_cache()
+            st.info(f"📅 Last updated: {rates_fetched_at.strftime('%Y-%m-%d %H:%M:%S')} ({format_age(rates_fetched_at)})")
+            if rate_cache.is_stale():
+                st.warning(f"⚠️ The latest refresh failed, so these rates are older than {RATES_TTL_SECONDS // 60} minutes. They are retried in the background.")
             
             # Popular currencies section
             st.subheader("🌍 Popular Currencies")
-            popular_currencies = ['USD', 'EUR', 'GBP', 'SGD', 'THB', 'IDR', 'JPY', 'CNY', 'AUD', 'INR']
-            
             # Create currency conversion table
             currency_data = []
-            for currency in popular_currencies:
+            for currency in POPULAR_CURRENCIES:
                 if currency in rates:
                     rate = rates[currency]
                     currency_names = {
@@ -1227,7 +3014,7 @@ def main():
                 amount_myr = st.number_input("Amount in MYR:", min_value=0.01, value=10.00, step=0.50)
             
             with col2:
-                available_currencies = [curr for curr in popular_currencies if curr in rates.keys()]
+                available_currencies = [curr for curr in POPULAR_CURRENCIES if curr in rates.keys()]
                 target_currency = st.selectbox("Convert to:", available_currencies)
             
             if target_currency and target_currency in rates:
@@ -1239,22 +3026,21 @@ def main():
             st.subheader("⚡ Manual Refresh")
             if st.button("🔄 Refresh Exchange Rates"):
                 with st.spinner("Fetching latest exchange rates..."):
-                    new_rates = get_exchange_rates()
+                    new_rates = get_rate_cache().refresh()
                     if new_rates:
-                        st.session_state.exchange_rates = new_rates
-                        st.session_state.rates_timestamp = datetime.now()
                         st.success("✅ Exchange rates updated successfully!")
                         st.rerun()
                     else:
                         st.error("❌ Failed to fetch exchange rates. Please try again later.")
+                        show_rate_failure()
             
             # Rate source info
             with st.expander("ℹ️ About Exchange Rates"):
-                st.write("""
+                st.write(f"""
                 **Data Source**: ExchangeRate-API.com
                 
                 **Update Frequency**: 
-                - Automatic refresh every 30 minutes
+                - Automatic refresh every {(RATES_TTL_SECONDS - RATES_REFRESH_AHEAD_SECONDS) // 60} minutes
                 - Manual refresh available anytime
                 
                 **Supported Currencies**: USD, EUR, GBP, SGD, THB, IDR, JPY, CNY, AUD, INR, and more
@@ -1271,14 +3057,13 @@ def main():
             
             if st.button("🔄 Retry Loading Exchange Rates"):
                 with st.spinner("Attempting to fetch exchange rates..."):
-                    new_rates = get_exchange_rates()
+                    new_rates = get_rate_cache().refresh()
                     if new_rates:
-                        st.session_state.exchange_rates = new_rates
-                        st.session_state.rates_timestamp = datetime.now()
                         st.success("✅ Exchange rates loaded successfully!")
                         st.rerun()
                     else:
                         st.error("❌ Still unable to fetch exchange rates.")
+                        show_rate_failure()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file